@@ -20,7 +20,7 @@ from .plotting import plot_graph, plot_map
 from .readers import Reader
 from .sources import Source
 from .sources import get_source as source  # so the user can do: cml.source(...)
-from .sources import load_source, load_source_lazily
+from .sources import load_source, load_source_async, load_source_lazily
 from .version import __version__
 from .wrappers import Wrapper
 
@@ -33,6 +33,7 @@ __all__ = [
     "interactive_map",
     "load_dataset",
     "load_source",
+    "load_source_async",
     "load_source_lazily",
     "new_plot",
     "plot_graph",
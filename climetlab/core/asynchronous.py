@@ -0,0 +1,179 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import asyncio
+import logging
+import weakref
+from urllib.parse import urlparse
+
+from multiurl.base import DownloaderBase
+
+from climetlab.core.caching import cache_file_async
+from climetlab.core.scheduler import DOWNLOAD_SCHEDULER
+from climetlab.core.settings import SETTINGS
+
+LOG = logging.getLogger(__name__)
+
+# Arguments of the url source that do not change what is downloaded
+URL_OPTIONS = (
+    "filter",
+    "merger",
+    "chunk_size",
+    "priority",
+    "owner",
+    "segments",
+    "range_method",
+    "update_if_out_of_date",
+)
+
+
+def _aiohttp():
+    try:
+        import aiohttp
+
+        return aiohttp
+    except ImportError:
+        LOG.debug("aiohttp is not installed, downloads will use threads")
+        return None
+
+
+async def _session_holder(aiohttp, sessions, loop):
+    # An async generator is closed by asyncio.run() when the loop shuts down,
+    # which also closes the session and its connections
+    timeout = aiohttp.ClientTimeout(
+        total=None,
+        sock_connect=SETTINGS.get("url-download-timeout"),
+        sock_read=SETTINGS.get("url-download-timeout"),
+    )
+    try:
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            yield session
+    finally:
+        sessions.pop(loop, None)
+
+
+class AsyncDownloadEngine:
+    """Runs the url transfers as coroutines on the running event loop, so that
+    many downloads can be in progress without a thread for each of them.
+    The connections are reused by all the downloads of the loop, and the
+    downloads share the limits of the threaded ones (see DownloadScheduler)."""
+
+    def __init__(self):
+        self._sessions = weakref.WeakKeyDictionary()
+
+    async def _session(self, aiohttp):
+        loop = asyncio.get_running_loop()
+        if loop not in self._sessions:
+            holder = _session_holder(aiohttp, self._sessions, loop)
+            session = await holder.__anext__()
+            if loop not in self._sessions:
+                self._sessions[loop] = (holder, session)
+            else:
+                # Another coroutine was quicker
+                await holder.aclose()
+        return self._sessions[loop][1]
+
+    def _can_prefetch(self, url, kwargs):
+        if not isinstance(url, str) or urlparse(url).scheme not in ("http", "https"):
+            return False
+
+        from climetlab.mirrors import get_active_mirrors
+
+        if get_active_mirrors():
+            return False
+
+        for k, v in kwargs.items():
+            if k in ("http_headers", "verify") or k in URL_OPTIONS:
+                continue
+            if k in ("parts", "force", "fake_headers") and not v:
+                continue
+            # The download would be different from the one of the url source
+            return False
+
+        return True
+
+    async def prefetch(self, name, *args, **kwargs):
+        """Downloads the data of the source `name` into the cache, if that can
+        be done asynchronously. Returns the path of the cached file, or None."""
+
+        if name != "url" or _aiohttp() is None:
+            return None
+
+        if args:
+            kwargs = dict(url=args[0], **kwargs)
+            if len(args) > 1:
+                return None
+
+        url = kwargs.pop("url", None)
+        if not self._can_prefetch(url, kwargs):
+            return None
+
+        # Without a file extension, the url source uses the headers to find it
+        extension = DownloaderBase(url).extension()
+        if extension == ".unknown":
+            return None
+
+        return await self.download(
+            url,
+            extension=extension,
+            http_headers=kwargs.get("http_headers"),
+            verify=kwargs.get("verify", True),
+            chunk_size=kwargs.get("chunk_size", 1024 * 1024),
+            owner=kwargs.get("owner"),
+        )
+
+    async def download(
+        self,
+        url,
+        extension,
+        http_headers=None,
+        verify=True,
+        chunk_size=1024 * 1024,
+        owner=None,
+    ):
+        from climetlab.sources.url import url_cache_data
+
+        if owner is None:
+            # Like a url source, each download is its own owner
+            owner = object()
+
+        aiohttp = _aiohttp()
+        loop = asyncio.get_running_loop()
+
+        async def create(target, args):
+            session = await self._session(aiohttp)
+            async with DOWNLOAD_SCHEDULER.async_connection(url, owner=owner):
+                LOG.info("Downloading %s", url)
+                async with session.get(
+                    url,
+                    headers=http_headers,
+                    ssl=True if verify else False,
+                ) as r:
+                    r.raise_for_status()
+                    # Files are written in a thread, not to block the loop
+                    f = await loop.run_in_executor(None, open, target, "wb")
+                    try:
+                        async for chunk in r.content.iter_chunked(chunk_size):
+                            await DOWNLOAD_SCHEDULER.throttle_async(len(chunk))
+                            await loop.run_in_executor(None, f.write, chunk)
+                    finally:
+                        await loop.run_in_executor(None, f.close)
+                    # Same as the cache data of the url source
+                    return url_cache_data({k.lower(): v for k, v in r.headers.items()})
+
+        # Same cache entry as the url source
+        return await cache_file_async(
+            "url",
+            create,
+            dict(url=url, parts=None),
+            extension=extension,
+        )
+
+
+ENGINE = AsyncDownloadEngine()
@@ -17,6 +17,7 @@ decide to read it or create it.
 
 """
 
+import asyncio
 import ctypes
 import datetime
 import hashlib
@@ -30,7 +31,7 @@ import threading
 import time
 from functools import wraps
 
-from filelock import FileLock
+from filelock import FileLock, Timeout
 
 from climetlab.core.settings import SETTINGS
 from climetlab.utils import humanize
@@ -103,10 +104,35 @@ def in_executor(func):
     return wrapped
 
 
+def in_executor_async(func):
+    # The coroutine is resumed by the cache thread, no other thread is involved
+    @wraps(func)
+    async def wrapped(*args, **kwargs):
+        global CACHE
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def done(s):
+            loop.call_soon_threadsafe(_set_future, future, s)
+
+        CACHE.enqueue(func, *args, **kwargs).add_done_callback(done)
+        return await future
+
+    return wrapped
+
+
+def _set_future(future, s):
+    if future.cancelled():
+        return
+    if isinstance(s._result, Exception):
+        future.set_exception(s._result)
+    else:
+        future.set_result(s._result)
+
+
 def in_executor_forget(func):
     @wraps(func)
     def wrapped(*args, **kwargs):
-        global CACHE
         CACHE.enqueue(func, *args, **kwargs)
         return None
 
@@ -121,6 +147,7 @@ class Future:
         self._condition = threading.Condition()
         self._ready = False
         self._result = None
+        self._callbacks = []
 
     def execute(self):
         try:
@@ -131,6 +158,16 @@ class Future:
         with self._condition:
             self._ready = True
             self._condition.notify_all()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def add_done_callback(self, callback):
+        with self._condition:
+            if not self._ready:
+                self._callbacks.append(callback)
+                return
+        callback(self)
 
     def result(self):
         with self._condition:
@@ -595,6 +632,30 @@ file_in_cache_directory = in_executor(CACHE._file_in_cache_directory)
 settings_changed = in_executor(CACHE._settings_changed)
 cache_directory = in_executor(CACHE._cache_directory)
 
+register_cache_file_async = in_executor_async(CACHE._register_cache_file)
+update_entry_async = in_executor_async(CACHE._update_entry)
+check_cache_size_async = in_executor_async(CACHE._check_cache_size)
+
+
+def cache_path(owner, args, hash_extra=None, extension=".cache"):
+    m = hashlib.sha256()
+    m.update(owner.encode("utf-8"))
+
+    m.update(
+        json.dumps(args, sort_keys=True, default=default_serialiser).encode("utf-8")
+    )
+    m.update(json.dumps(hash_extra, sort_keys=True).encode("utf-8"))
+    m.update(json.dumps(extension, sort_keys=True).encode("utf-8"))
+
+    return os.path.join(
+        SETTINGS.get("cache-directory"),
+        "{}-{}{}".format(
+            owner.lower(),
+            m.hexdigest(),
+            extension,
+        ),
+    )
+
 
 def cache_file(
     owner: str,
@@ -621,28 +682,12 @@ def cache_file(
         Full path to the cache file.
     """
 
-    m = hashlib.sha256()
-    m.update(owner.encode("utf-8"))
-
-    m.update(
-        json.dumps(args, sort_keys=True, default=default_serialiser).encode("utf-8")
-    )
-    m.update(json.dumps(hash_extra, sort_keys=True).encode("utf-8"))
-    m.update(json.dumps(extension, sort_keys=True).encode("utf-8"))
-
     if replace is not None:
         # Don't replace files that are not in the cache
         if not file_in_cache_directory(replace):
             replace = None
 
-    path = os.path.join(
-        SETTINGS.get("cache-directory"),
-        "{}-{}{}".format(
-            owner.lower(),
-            m.hexdigest(),
-            extension,
-        ),
-    )
+    path = cache_path(owner, args, hash_extra, extension)
 
     record = register_cache_file(path, owner, args)
     if os.path.exists(path):
@@ -680,6 +725,71 @@ def cache_file(
     return path
 
 
+async def cache_file_async(
+    owner: str,
+    create,
+    args,
+    hash_extra=None,
+    extension: str = ".cache",
+    force=False,
+):
+    """Same as :py:func:`cache_file`, for coroutines. `create` is a coroutine
+    function, and the cache database is updated without blocking the event loop."""
+
+    path = cache_path(owner, args, hash_extra, extension)
+
+    await register_cache_file_async(path, owner, args)
+    if os.path.exists(path) and force:
+        await in_executor_async(CACHE._decache_file)(path)
+
+    if not os.path.exists(path):
+
+        lock = FileLock(path + ".lock")
+        while True:
+            try:
+                lock.acquire(timeout=0)
+                break
+            except Timeout:
+                # Another coroutine, thread or process is creating the file
+                await asyncio.sleep(0.1)
+
+        try:
+            if not os.path.exists(path):
+                owner_data = await create(path + ".tmp", args)
+                await asyncio.get_running_loop().run_in_executor(
+                    None, os.rename, path + ".tmp", path
+                )
+                await update_entry_async(path, owner_data)
+                await check_cache_size_async()
+        finally:
+            lock.release()
+
+        try:
+            os.unlink(path + ".lock")
+        except OSError:
+            pass
+
+    return path
+
+
+def _auxiliary_args(path, index, stat):
+    return (
+        path,
+        stat.st_ctime,
+        stat.st_mtime,
+        stat.st_size,
+        index,
+    )
+
+
+def auxiliary_cache_path(owner, path, index=0, extension=".cache", stat=None):
+    # Path of the auxiliary cache file of `path` (see below),
+    # which may not have been created yet
+    if stat is None:
+        stat = os.stat(path)
+    return cache_path(owner, _auxiliary_args(path, index, stat), extension=extension)
+
+
 def auxiliary_cache_file(
     owner,
     path,
@@ -701,13 +811,7 @@ def auxiliary_cache_file(
     return cache_file(
         owner,
         create,
-        (
-            path,
-            stat.st_ctime,
-            stat.st_mtime,
-            stat.st_size,
-            index,
-        ),
+        _auxiliary_args(path, index, stat),
         extension=extension,
     )
 
@@ -0,0 +1,295 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from climetlab.core.caching import (
+    cache_file,
+    check_cache_size,
+    file_in_cache_directory,
+    update_entry,
+)
+from climetlab.core.settings import SETTINGS
+
+LOG = logging.getLogger(__name__)
+
+# Minimum delay between two updates of the size of a store in the cache database
+UPDATE_INTERVAL = 5
+
+CHUNK_INDEX = re.compile(r"^\d+(\.\d+)*$")
+
+
+class ChunkCache:
+    """Read-only mapping on top of a remote Zarr store (a ``fsspec`` mapper
+    such as ``s3fs.S3Map``) that keeps the chunks on disk.
+
+    The chunks of a store are saved in a directory of the CliMetLab cache,
+    named after the store URL, the chunk key and the ETag of the object, so
+    that a chunk that is rewritten on the server is downloaded again. Each
+    store uses at most ``zarr-chunk-cache-size`` bytes, the least recently used
+    chunks being deleted first, and the directory counts towards the limits
+    of the CliMetLab cache.
+
+    When a chunk is not in the cache, the ``zarr-prefetch-chunks`` chunks that
+    follow it in the same array are downloaded at the same time.
+    """
+
+    def __init__(self, store, url, maximum_size=None, prefetch=None):
+        self._store = store
+        self._fs = store.fs
+        self._root = store.root.rstrip("/")
+        self._url = url
+
+        if maximum_size is None:
+            maximum_size = SETTINGS.get("zarr-chunk-cache-size")
+        if prefetch is None:
+            prefetch = SETTINGS.get("zarr-prefetch-chunks")
+
+        self.maximum_size = maximum_size
+        self.prefetch = prefetch
+
+        self._lock = threading.RLock()
+        self._listings = {}
+        self._grids = {}
+        self._last_update = 0
+
+        self._open()
+
+    def _open(self):
+        def create(target, args):
+            os.mkdir(target)
+
+        self.directory = cache_file(
+            "zarr",
+            create,
+            dict(url=self._url),
+            extension=".chunks",
+        )
+
+        # Least recently used first
+        entries = sorted(os.scandir(self.directory), key=lambda e: e.stat().st_mtime)
+        self._entries = OrderedDict(
+            (e.name, e.stat().st_size) for e in entries if not e.name.endswith(".tmp")
+        )
+        self._size = sum(self._entries.values())
+
+    def _path(self, key):
+        return f"{self._root}/{key}"
+
+    def _listing(self, directory):
+        """ETags of the objects of `directory`, read once per store, or None
+        if they cannot be listed."""
+        with self._lock:
+            if directory in self._listings:
+                return self._listings[directory]
+
+        try:
+            # fsspec file systems are shared, and keep their own listings
+            self._fs.invalidate_cache(directory)
+            listing = {
+                e["name"].rstrip("/").split("/")[-1]: e.get("ETag")
+                for e in self._fs.ls(directory, detail=True)
+                if e.get("type") == "file"
+            }
+        except FileNotFoundError:
+            listing = {}
+        except Exception as e:
+            LOG.debug("Cannot list %s: %s", directory, e)
+            listing = None
+
+        with self._lock:
+            self._listings[directory] = listing
+        return listing
+
+    def _etag(self, key):
+        directory, _, name = self._path(key).rpartition("/")
+        listing = self._listing(directory)
+        if listing is None:
+            return None
+        if name not in listing:
+            raise KeyError(key)
+        return listing[name]
+
+    def _name(self, key, etag):
+        m = hashlib.sha256()
+        m.update(json.dumps([self._url, key, etag]).encode("utf-8"))
+        return m.hexdigest()
+
+    def _read(self, name):
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._entries.pop(name, 0)
+            return None
+
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+        return data
+
+    def _write(self, name, data):
+        if not os.path.exists(self.directory):
+            # The directory was removed when the CliMetLab cache was cleaned
+            with self._lock:
+                self._open()
+
+        path = os.path.join(self.directory, name)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self._lock:
+            self._size -= self._entries.pop(name, 0)
+            self._entries[name] = len(data)
+            self._size += len(data)
+            self._evict()
+
+        self._update()
+
+    def _evict(self):
+        if self.maximum_size is None:
+            return
+
+        while self._size > self.maximum_size and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def _update(self):
+        now = time.time()
+        if now - self._last_update < UPDATE_INTERVAL:
+            return
+        self._last_update = now
+
+        if file_in_cache_directory(self.directory):
+            update_entry(self.directory)
+            check_cache_size()
+
+    def _grid(self, array):
+        """Number of chunks of `array` along each of its dimensions."""
+        with self._lock:
+            if array in self._grids:
+                return self._grids[array]
+
+        grid = None
+        try:
+            zarray = json.loads(self[f"{array}/.zarray" if array else ".zarray"])
+            if zarray.get("dimension_separator", ".") == ".":
+                grid = [
+                    int(math.ceil(s / c))
+                    for s, c in zip(zarray["shape"], zarray["chunks"])
+                ]
+        except KeyError:
+            pass
+
+        with self._lock:
+            self._grids[array] = grid
+        return grid
+
+    def _neighbours(self, key):
+        """Keys of the chunks that follow `key` in its array."""
+        if not self.prefetch:
+            return []
+
+        array, _, index = key.rpartition("/")
+        if not CHUNK_INDEX.match(index):
+            return []
+
+        grid = self._grid(array)
+        index = [int(i) for i in index.split(".")]
+        if grid is None or len(grid) != len(index):
+            return []
+
+        result = []
+        while len(result) < self.prefetch:
+            # Next chunk in C order
+            for d in reversed(range(len(index))):
+                index[d] += 1
+                if index[d] < grid[d]:
+                    break
+                index[d] = 0
+            else:
+                break
+
+            result.append("/".join(filter(None, [array, ".".join(map(str, index))])))
+
+        return result
+
+    def _fetch(self, key):
+        keys = [key]
+        for k in self._neighbours(key):
+            try:
+                etag = self._etag(k)
+            except KeyError:
+                continue
+            if self._name(k, etag) not in self._entries:
+                keys.append(k)
+
+        LOG.debug("Downloading %s chunk(s) from %s", len(keys), self._url)
+        paths = {self._path(k): k for k in keys}
+        data = {
+            paths[self._fs._strip_protocol(path)]: value
+            for path, value in self._fs.cat(list(paths), on_error="return").items()
+        }
+
+        for k, value in data.items():
+            if not isinstance(value, Exception):
+                self._write(self._name(k, self._etag(k)), value)
+
+        value = data[key]
+        if isinstance(value, FileNotFoundError):
+            raise KeyError(key)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def __getitem__(self, key):
+        etag = self._etag(key)
+        if etag is None:
+            return self._store[key]
+
+        data = self._read(self._name(key, etag))
+        if data is not None:
+            return data
+
+        return self._fetch(key)
+
+    def __contains__(self, key):
+        try:
+            etag = self._etag(key)
+        except KeyError:
+            return False
+        if etag is None:
+            return key in self._store
+        return True
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self):
+        return len(self._store)
+
+    def keys(self):
+        return self._store.keys()
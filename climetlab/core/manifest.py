@@ -0,0 +1,187 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import json
+import logging
+import os
+import threading
+
+from climetlab.core.caching import (
+    cache_file,
+    check_cache_size,
+    file_in_cache_directory,
+    update_entry,
+)
+from climetlab.core.settings import SETTINGS
+from climetlab.core.thread import SoftThreadPool
+from climetlab.readers import index_path, remember, sniff
+
+LOG = logging.getLogger(__name__)
+
+# Number of files checked by each task of a scan
+BATCH_SIZE = 1000
+
+
+def _list(directory):
+    """Files and sub-directories of `directory`, without following links to
+    directories. As ``os.walk``, directories that cannot be listed are ignored."""
+    files, directories = [], []
+    try:
+        with os.scandir(directory) as it:
+            for e in it:
+                if not e.is_dir():
+                    files.append(e.path)
+                elif not e.is_symlink():
+                    directories.append(e.path)
+    except OSError as e:
+        LOG.debug("Cannot list %s: %s", directory, e)
+    return files, directories
+
+
+class DirectoryManifest:
+    """Files of the directory tree `path`, with their size, modification time
+    and format, and the index of the file kept by its reader in the cache.
+
+    The manifest is saved in the cache. When a directory is opened again,
+    its tree is listed with ``os.scandir`` and the files are checked with
+    ``number-of-scan-threads`` threads, but only the new or modified files
+    are opened to find their format. `filter` is called with the path of
+    each file, and the files it rejects are not opened at all.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path, filter=None, threads=None):
+        self.path = path
+        self.filter = filter if filter is not None else lambda _: True
+
+        if threads is None:
+            threads = SETTINGS.get("number-of-scan-threads")
+
+        self.manifest = cache_file(
+            "directory",
+            lambda target, args: self._write(target, {}),
+            dict(path=os.path.abspath(path)),
+            extension=".json",
+        )
+
+        previous = self._load()
+        self.entries = {}
+        self.selected = []
+        self._lock = threading.Lock()
+
+        with SoftThreadPool(nthreads=threads) as pool:
+            self._scan(pool, previous)
+
+        if self.entries != previous:
+            LOG.debug("Updating manifest of %s", self.path)
+            self._write(self.manifest, self.entries)
+            if file_in_cache_directory(self.manifest):
+                update_entry(self.manifest)
+                check_cache_size()
+
+    def _load(self):
+        try:
+            with open(self.manifest) as f:
+                manifest = json.load(f)
+            if manifest["version"] == self.VERSION:
+                return manifest["entries"]
+        except Exception:
+            LOG.exception("Cannot load manifest %s", self.manifest)
+        return {}
+
+    def _write(self, target, entries):
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                dict(
+                    version=self.VERSION,
+                    path=os.path.abspath(self.path),
+                    entries=entries,
+                ),
+                f,
+            )
+        os.replace(tmp, target)
+
+    def _scan(self, pool, previous):
+        prefix = os.path.join(self.path, "")
+
+        pending = [pool.submit(_list, self.path)]
+        checks = []
+        while pending:
+            files, directories = pending.pop(0).result()
+            pending.extend(pool.submit(_list, d) for d in directories)
+            for i in range(0, len(files), BATCH_SIZE):
+                checks.append(
+                    pool.submit(
+                        self._check, files[i : i + BATCH_SIZE], prefix, previous
+                    )
+                )
+
+        for check in checks:
+            check.result()
+
+    def _check(self, paths, prefix, previous):
+        entries = {}
+        selected = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Removed during the scan
+                continue
+
+            name = path[len(prefix) :]
+            entry = dict(size=stat.st_size, mtime=stat.st_mtime_ns)
+
+            old = previous.get(name, {})
+            if all(old.get(k) == v for k, v in entry.items()):
+                entry = old
+
+            if self.filter(path):
+                selected.append(name)
+                if "format" not in entry:
+                    entry = dict(entry, **self._sniff(path, stat))
+
+            entries[name] = entry
+
+        with self._lock:
+            self.entries.update(entries)
+            self.selected.extend(selected)
+
+    def _sniff(self, path, stat):
+        try:
+            magic, format = sniff(path)
+        except OSError as e:
+            LOG.debug("Cannot open %s: %s", path, e)
+            return {}
+
+        index = None
+        if format is not None:
+            index = index_path(format, path, stat)
+
+        return dict(format=format, magic=magic.hex(), index=index)
+
+    def files(self):
+        """Paths of the files selected by the filter, in alphabetical order."""
+        return [os.path.join(self.path, name) for name in sorted(self.selected)]
+
+    def remember(self):
+        """Records the formats of the selected files, so that they are not
+        detected again when the files are opened."""
+        for name in self.selected:
+            entry = self.entries[name]
+            if entry.get("format") is not None:
+                remember(
+                    os.path.join(self.path, name),
+                    entry["size"],
+                    entry["mtime"],
+                    entry["format"],
+                    bytes.fromhex(entry["magic"]),
+                )
@@ -0,0 +1,235 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import itertools
+import logging
+
+LOG = logging.getLogger(__name__)
+
+# Options of the retrievers that are not part of the requests
+PLANNER_OPTIONS = ("split_on", "max_fields")
+
+# Keys whose list values describe each field, not a dimension of the request
+SHAPE_KEYS = ("area", "grid")
+
+# Dimensions of the MARS and CDS requests that accept several values, so
+# that requests that only differ by one of them can be merged. The other
+# keys (format, class, stream, levtype, expver, type...) take a single value.
+MERGEABLE_KEYS = (
+    "date",
+    "time",
+    "step",
+    "param",
+    "levelist",
+    "number",
+    "hdate",
+    "fcmonth",
+    "frequency",
+    "direction",
+    "channel",
+    "variable",
+    "pressure_level",
+    "model_level",
+    "year",
+    "month",
+    "day",
+    "leadtime_hour",
+    "leadtime_month",
+)
+
+
+def _is_list(value):
+    return isinstance(value, (list, tuple))
+
+
+def _as_list(value):
+    return list(value) if _is_list(value) else [value]
+
+
+def _dimensions(request):
+    return [k for k, v in request.items() if _is_list(v) and k not in SHAPE_KEYS]
+
+
+def volume(request):
+    """Estimated number of fields returned by `request`."""
+    n = 1
+    for k in _dimensions(request):
+        n *= max(1, len(request[k]))
+    return n
+
+
+def requests_and_options(args, kwargs):
+    """Returns the requests given to a retriever, either as keyword arguments
+    or as dictionaries (completed by the keyword arguments), and the options
+    of the planner."""
+
+    kwargs = dict(kwargs)
+    options = {k: kwargs.pop(k) for k in PLANNER_OPTIONS if k in kwargs}
+
+    requests = []
+    for a in args or [{}]:
+        assert isinstance(a, dict), a
+        r = dict(kwargs, **a)
+        options.update({k: r.pop(k) for k in PLANNER_OPTIONS if k in r})
+        requests.append(r)
+
+    return requests, options
+
+
+class RequestPlanner:
+    """Turns the requests given to a retriever (CDS, MARS...) into the requests
+    submitted to the service:
+
+    - requests already in the cache are used as they are,
+    - compatible requests, i.e. that only differ by the values of one of the
+      MERGEABLE_KEYS, are merged, so that fewer requests are queued,
+    - requests are split on the keys given by `split_on` (a key, a list of keys,
+      or a dictionary giving the number of values of each key per request),
+      and so that each one returns at most `max_fields` fields,
+    - the values of a request that are already in the cache, e.g. because they
+      were retrieved with a different split, are not requested again.
+
+    `cached` is a callable that tells if a request is in the cache.
+    """
+
+    def __init__(self, split_on=None, max_fields=None, cached=None):
+        if split_on is None:
+            split_on = {}
+        if isinstance(split_on, str):
+            split_on = [split_on]
+        if not isinstance(split_on, dict):
+            split_on = {k: 1 for k in split_on}
+
+        self.split_on = split_on
+        self.max_fields = max_fields
+        self.cached = cached if cached is not None else lambda request: False
+
+    def plan(self, requests):
+        result = []
+        todo = []
+        for r in requests:
+            (result if self.cached(r) else todo).append(r)
+
+        for r in self.coalesce(todo):
+            for chunk in self.split(r):
+                result.extend(self.reuse(chunk))
+
+        LOG.debug("Planned %s request(s) for %s", len(result), len(requests))
+        return result
+
+    def _merge(self, a, b):
+        if a.keys() != b.keys():
+            return None
+
+        diff = [k for k in a if _as_list(a[k]) != _as_list(b[k])]
+        if not diff:
+            return a
+
+        if len(diff) != 1 or diff[0] not in MERGEABLE_KEYS:
+            return None
+
+        key = diff[0]
+        values = _as_list(a[key])
+        values += [v for v in _as_list(b[key]) if v not in values]
+        merged = dict(a, **{key: values})
+
+        if self.max_fields and volume(merged) > self.max_fields:
+            return None
+
+        return merged
+
+    def coalesce(self, requests):
+        result = list(requests)
+        while True:
+            merged = []
+            for r in result:
+                for i, other in enumerate(merged):
+                    m = self._merge(other, r)
+                    if m is not None:
+                        merged[i] = m
+                        break
+                else:
+                    merged.append(r)
+
+            if len(merged) == len(result):
+                break
+            result = merged
+
+        if len(result) < len(requests):
+            LOG.info("Merged %s requests into %s", len(requests), len(result))
+        return result
+
+    def split(self, request):
+        requests = [request]
+        for key, n in self.split_on.items():
+            requests = list(
+                itertools.chain.from_iterable(self._split(r, key, n) for r in requests)
+            )
+
+        if self.max_fields:
+            requests = list(
+                itertools.chain.from_iterable(self._split_volume(r) for r in requests)
+            )
+
+        return requests
+
+    def _split(self, request, key, n):
+        if not _is_list(request.get(key)):
+            return [request]
+
+        values = request[key]
+        if n == 1:
+            return [dict(request, **{key: v}) for v in values]
+
+        return [
+            dict(request, **{key: list(values[i : i + n])})
+            for i in range(0, len(values), n)
+        ]
+
+    def _split_volume(self, request):
+        total = volume(request)
+        if total <= self.max_fields:
+            return [request]
+
+        dimensions = [k for k in _dimensions(request) if len(request[k]) > 1]
+        if not dimensions:
+            return [request]
+
+        key = max(dimensions, key=lambda k: len(request[k]))
+        n = max(1, self.max_fields // (total // len(request[key])))
+
+        return list(
+            itertools.chain.from_iterable(
+                self._split_volume(r) for r in self._split(request, key, n)
+            )
+        )
+
+    def reuse(self, request):
+        """Splits `request` so that its values already in the cache are
+        retrieved from there."""
+
+        if self.cached(request):
+            return [request]
+
+        best, hits = None, []
+        for key in _dimensions(request):
+            found = [v for v in request[key] if self.cached(dict(request, **{key: v}))]
+            if len(found) > len(hits):
+                best, hits = key, found
+
+        if not hits:
+            return [request]
+
+        LOG.info("Reusing %s cached value(s) of '%s'", len(hits), best)
+
+        result = [dict(request, **{best: v}) for v in hits]
+        rest = [v for v in request[best] if v not in hits]
+        if rest:
+            result.extend(self.reuse(dict(request, **{best: rest})))
+        return result
@@ -0,0 +1,180 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+
+from climetlab.core.settings import SETTINGS
+
+LOG = logging.getLogger(__name__)
+
+# How often a coroutine checks if a connection is available
+POLLING_INTERVAL = 0.05
+
+
+def host_of(url):
+    return urlparse(url).netloc or "localhost"
+
+
+class _Waiter:
+    def __init__(self, owner, priority, sequence):
+        self.owner = owner
+        self.priority = priority
+        self.sequence = sequence
+
+
+class DownloadScheduler:
+    """Process-wide scheduler shared by all the url downloads.
+
+    The number of simultaneous connections to a host is capped by the
+    "maximum-connections-per-host" setting, whatever the number of sources
+    and thread pools downloading from it. When a connection becomes available,
+    it is given to the waiting download with the highest priority, then to the
+    owner (e.g. the source) with the fewest connections to the host, then to the
+    owner served least recently, so that a large request does not starve the
+    others. The total bandwidth can be limited with the
+    "maximum-download-bandwidth" setting.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._active = defaultdict(int)
+        self._owners = defaultdict(int)
+        self._waiting = defaultdict(list)
+        self._served = defaultdict(dict)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._clock = 0.0
+
+    def _maximum_connections(self):
+        return max(1, SETTINGS.get("maximum-connections-per-host"))
+
+    def _next(self, host):
+        return min(
+            self._waiting[host],
+            key=lambda w: (
+                -w.priority,
+                self._owners[(host, w.owner)],
+                self._served[host].get(w.owner, -1),
+                w.sequence,
+            ),
+        )
+
+    def _enqueue(self, host, owner, priority):
+        waiter = _Waiter(owner, priority, next(self._sequence))
+        self._waiting[host].append(waiter)
+        return waiter
+
+    def _dequeue(self, host, waiter):
+        self._waiting[host].remove(waiter)
+        if not self._waiting[host]:
+            del self._waiting[host]
+
+    def _can_start(self, host, waiter):
+        return (
+            self._active[host] < self._maximum_connections()
+            and self._next(host) is waiter
+        )
+
+    def _start(self, host, waiter):
+        self._dequeue(host, waiter)
+        self._active[host] += 1
+        self._owners[(host, waiter.owner)] += 1
+        self._served[host][waiter.owner] = waiter.sequence
+        # Let the next waiter check if a connection is still available
+        self._condition.notify_all()
+
+    def _finish(self, host, owner):
+        with self._condition:
+            self._active[host] -= 1
+            if self._active[host] == 0:
+                del self._active[host]
+                if host not in self._waiting:
+                    del self._served[host]
+            self._owners[(host, owner)] -= 1
+            if self._owners[(host, owner)] == 0:
+                del self._owners[(host, owner)]
+            self._condition.notify_all()
+
+    @contextmanager
+    def connection(self, url, owner=None, priority=0):
+        host = host_of(url)
+
+        with self._condition:
+            waiter = self._enqueue(host, owner, priority)
+            while not self._can_start(host, waiter):
+                self._condition.wait()
+            self._start(host, waiter)
+
+        try:
+            yield
+        finally:
+            self._finish(host, owner)
+
+    @asynccontextmanager
+    async def async_connection(self, url, owner=None, priority=0):
+        """Same as `connection()`, for coroutines. The event loop is not blocked
+        while waiting for a connection, and the downloads of the threads and
+        of the coroutines share the same limits."""
+        host = host_of(url)
+
+        with self._condition:
+            waiter = self._enqueue(host, owner, priority)
+
+        try:
+            while True:
+                with self._condition:
+                    if self._can_start(host, waiter):
+                        self._start(host, waiter)
+                        break
+                await asyncio.sleep(POLLING_INTERVAL)
+        except BaseException:
+            # e.g. the task was cancelled
+            with self._condition:
+                self._dequeue(host, waiter)
+                if not self._active.get(host) and host not in self._waiting:
+                    self._served.pop(host, None)
+                self._condition.notify_all()
+            raise
+
+        try:
+            yield
+        finally:
+            self._finish(host, owner)
+
+    def _delay(self, nbytes):
+        bandwidth = SETTINGS.get("maximum-download-bandwidth")
+        if not bandwidth:
+            return 0
+
+        with self._lock:
+            now = time.monotonic()
+            self._clock = max(self._clock, now) + nbytes / bandwidth
+            return self._clock - now
+
+    def throttle(self, nbytes):
+        """Wait until `nbytes` can be transferred within the bandwidth budget."""
+        delay = self._delay(nbytes)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def throttle_async(self, nbytes):
+        """Same as `throttle()`, for coroutines."""
+        delay = self._delay(nbytes)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+DOWNLOAD_SCHEDULER = DownloadScheduler()
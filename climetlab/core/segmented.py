@@ -0,0 +1,200 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import json
+import logging
+import os
+import threading
+import time
+
+from multiurl import robust
+
+from climetlab.core.scheduler import DOWNLOAD_SCHEDULER
+from climetlab.core.sessions import SESSIONS
+from climetlab.core.thread import SoftThreadPool
+
+LOG = logging.getLogger(__name__)
+
+
+def _ignore(*args, **kwargs):
+    pass
+
+
+def split(size, segments):
+    length = -(-size // segments)
+    return [[start, min(start + length, size), 0] for start in range(0, size, length)]
+
+
+class SegmentedDownload:
+    """Download a single large file with several HTTP range requests in parallel.
+
+    The segments are written at their offset in a preallocated file. The progress
+    of each segment is kept in a state file next to it, so that an interrupted
+    download only fetches the missing bytes of each segment.
+    """
+
+    def __init__(
+        self,
+        url,
+        size,
+        segments,
+        etag=None,
+        verify=True,
+        timeout=None,
+        http_headers=None,
+        chunk_size=1024 * 1024,
+        owner=None,
+        priority=0,
+        progress_bar=None,
+        statistics_gatherer=_ignore,
+        title=None,
+    ):
+        self.url = url
+        self.size = size
+        self.segments = segments
+        self.etag = etag
+        self.verify = verify
+        self.timeout = timeout
+        self.http_headers = http_headers if http_headers else {}
+        self.chunk_size = chunk_size
+        self.owner = owner
+        self.priority = priority
+        self.progress_bar = progress_bar
+        self.statistics_gatherer = statistics_gatherer
+        self.title = title if title is not None else os.path.basename(url)
+        self._lock = threading.Lock()
+
+    def _load_state(self, download, state):
+        if not os.path.exists(download) or not os.path.exists(state):
+            return None
+
+        try:
+            with open(state) as f:
+                s = json.load(f)
+        except Exception:
+            LOG.warning("Ignoring invalid download state %s", state)
+            return None
+
+        if (
+            s.get("url") != self.url
+            or s.get("size") != self.size
+            or s.get("etag") != self.etag
+            or os.path.getsize(download) != self.size
+        ):
+            LOG.warning("Remote file %s has changed, restarting download", self.url)
+            return None
+
+        return s["segments"]
+
+    def _save_state(self, state, segments):
+        tmp = state + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                dict(url=self.url, size=self.size, etag=self.etag, segments=segments),
+                f,
+            )
+        os.replace(tmp, state)
+
+    def download(self, target):
+        download = target + ".download"
+        state = download + ".segments"
+
+        segments = self._load_state(download, state)
+        if segments is None:
+            segments = split(self.size, self.segments)
+            with open(download, "wb") as f:
+                f.truncate(self.size)
+            self._save_state(state, segments)
+        else:
+            LOG.info("Resuming download of %s", self.url)
+
+        pending = [s for s in segments if s[0] + s[2] < s[1]]
+        initial = sum(s[2] for s in segments)
+
+        start = time.time()
+        fd = os.open(download, os.O_RDWR | getattr(os, "O_BINARY", 0))
+        try:
+            with self.progress_bar(
+                total=self.size,
+                initial=initial,
+                desc=self.title,
+            ) as pbar:
+                if pending:
+                    with SoftThreadPool(nthreads=len(pending)) as pool:
+                        futures = [
+                            pool.submit(self._transfer, fd, s, segments, state, pbar)
+                            for s in pending
+                        ]
+                        for f in futures:
+                            f.result()
+        finally:
+            os.close(fd)
+
+        self.statistics_gatherer(
+            "transfer",
+            url=self.url,
+            total=self.size - initial,
+            elapsed=time.time() - start,
+        )
+
+        os.rename(download, target)
+        os.unlink(state)
+
+    def _write(self, fd, data, offset):
+        if hasattr(os, "pwrite"):
+            while data:
+                n = os.pwrite(fd, data, offset)
+                data = data[n:]
+                offset += n
+        else:
+            with self._lock:
+                os.lseek(fd, offset, os.SEEK_SET)
+                os.write(fd, data)
+
+    def _transfer(self, fd, segment, segments, state, pbar):
+        with DOWNLOAD_SCHEDULER.connection(
+            self.url,
+            owner=self.owner,
+            priority=self.priority,
+        ):
+            start, end, done = segment
+            headers = dict(self.http_headers)
+            headers["range"] = f"bytes={start + done}-{end - 1}"
+
+            r = robust(SESSIONS.get)(
+                self.url,
+                stream=True,
+                headers=headers,
+                verify=self.verify,
+                timeout=self.timeout,
+            )
+            try:
+                r.raise_for_status()
+                if r.status_code != 206:
+                    raise ValueError(
+                        f"Server did not return a partial content for {self.url}"
+                    )
+
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
+                    if not chunk:
+                        continue
+                    chunk = chunk[: end - start - segment[2]]
+                    self._write(fd, chunk, start + segment[2])
+                    pbar.update(len(chunk))
+                    with self._lock:
+                        segment[2] += len(chunk)
+                        self._save_state(state, segments)
+            finally:
+                r.close()
+
+        if start + segment[2] != end:
+            raise ValueError(
+                f"Incomplete segment {start}-{end} of {self.url}"
+                f" ({segment[2]} bytes out of {end - start})"
+            )
@@ -0,0 +1,68 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import logging
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from climetlab.core.settings import SETTINGS
+
+LOG = logging.getLogger(__name__)
+
+
+class SessionPool:
+    """Process-wide pool of HTTP sessions, one per host, so that the
+    connections (and their TCP and TLS handshakes) are reused by all the
+    downloads from the same server."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def session(self, url):
+        """Returns the session for the host of `url`, or None if `url` is not
+        a HTTP url."""
+        o = urlparse(url)
+        if o.scheme not in ("http", "https"):
+            return None
+
+        key = (o.scheme, o.netloc)
+        with self._lock:
+            if key not in self._sessions:
+                LOG.debug("New HTTP session for %s://%s", *key)
+                self._sessions[key] = self._new_session()
+            return self._sessions[key]
+
+    def _new_session(self):
+        # Enough connections for all the threads that may use the session
+        size = max(
+            SETTINGS.get("maximum-connections-per-host"),
+            SETTINGS.get("number-of-download-threads"),
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=size)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def get(self, url, **kwargs):
+        session = self.session(url)
+        return (requests if session is None else session).get(url, **kwargs)
+
+    def clear(self):
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            session.close()
+
+
+SESSIONS = SessionPool()
@@ -102,6 +102,20 @@ SETTINGS_AND_HELP = {
         5,
         """Number of threads used to download data.""",
     ),
+    "number-of-scan-threads": _(
+        8,
+        """Number of threads used to list the files of a directory tree and check if they have changed.""",
+    ),
+    "maximum-connections-per-host": _(
+        4,
+        """Maximum number of simultaneous downloads from the same host, across all sources.""",
+    ),
+    "maximum-download-bandwidth": _(
+        None,
+        """Maximum bandwidth used by all downloads, in bytes per second (ex: 10M).""",
+        getter="_as_bytes",
+        none_ok=True,
+    ),
     "maximum-cache-size": _(
         None,
         """Maximum disk space used by the CliMetLab cache (ex: 100G or 2T).""",
@@ -114,6 +128,26 @@ SETTINGS_AND_HELP = {
         See :doc:`/guide/caching` for more information.""",
         getter="_as_percent",
     ),
+    "segmented-download-threshold": _(
+        "256M",
+        """Size above which a file is downloaded with several simultaneous connections
+        (see ``maximum-connections-per-host``). Set to ``null`` to disable.""",
+        getter="_as_bytes",
+        none_ok=True,
+    ),
+    "zarr-chunk-cache-size": _(
+        "1G",
+        """Maximum disk space used to cache the chunks of each remote Zarr store, the least
+        recently used chunks being deleted first. Set to ``null`` to only use the limits
+        of the CliMetLab cache.""",
+        getter="_as_bytes",
+        none_ok=True,
+    ),
+    "zarr-prefetch-chunks": _(
+        4,
+        """Number of neighbouring chunks downloaded in parallel with a chunk of a remote
+        Zarr store that is not in the cache.""",
+    ),
     "url-download-timeout": _(
         "30s",
         """Timeout when downloading from an url.""",
@@ -123,6 +157,13 @@ SETTINGS_AND_HELP = {
         True,
         "Perform a HTTP request to check if the remote version of a cache file has changed",
     ),
+    "url-freshness-period": _(
+        "1h",
+        """Period during which a cached URL is not checked again for changes, unless the server
+        specifies a different one with 'Cache-Control: max-age'. Set to ``null`` to always check.""",
+        getter="_as_seconds",
+        none_ok=True,
+    ),
     "download-out-of-date-urls": _(
         False,
         "Re-download URLs when the remote version of a cached file as been changed",
@@ -7,11 +7,35 @@
 # nor does it submit to any jurisdiction.
 #
 
-from collections import defaultdict
+import copy
+import threading
+from collections import OrderedDict, defaultdict
 
 from climetlab.utils.patterns import Pattern
 
-from .backends import IndexBackend, JsonIndexBackend
+from .backends import (
+    IndexBackend,
+    JsonIndexBackend,
+    SegmentedIndexBackend,
+    lookup_backends,
+)
+
+MANIFEST_EXTENSION = ".manifest"
+
+# Number of lookup results remembered by each index
+MAXIMUM_LOOKUPS = 256
+
+
+def _canonical(value):
+    if isinstance(value, (list, tuple)):
+        if len(value) == 1:
+            return _canonical(value[0])
+        return tuple(_canonical(v) for v in value)
+    return value
+
+
+def canonical_request(request):
+    return tuple(sorted((k, _canonical(v)) for k, v in request.items()))
 
 
 class Index:
@@ -20,6 +44,58 @@ class Index:
             backend = JsonIndexBackend
         assert issubclass(backend, IndexBackend), backend
         self._backend_constructor = backend
+        self._lookups = OrderedDict()
+        self._lookups_lock = threading.Lock()
+
+    def lookup_request(self, request, metadata=False):
+        try:
+            key = (canonical_request(request), metadata)
+            hash(key)
+        except TypeError:
+            # Unhashable values in the request
+            return self._lookup_request(copy.deepcopy(request), metadata=metadata)
+
+        with self._lookups_lock:
+            if key in self._lookups:
+                self._lookups.move_to_end(key)
+                return copy.deepcopy(self._lookups[key])
+
+        # The lookup must not change the user's request
+        result = self._lookup_request(copy.deepcopy(request), metadata=metadata)
+
+        with self._lookups_lock:
+            self._lookups[key] = result
+            while len(self._lookups) > MAXIMUM_LOOKUPS:
+                self._lookups.popitem(last=False)
+
+        return copy.deepcopy(result)
+
+    def _lookup_request(self, request, metadata=False):
+        raise NotImplementedError()
+
+    def invalidate(self):
+        """Forget the results of previous lookups."""
+        with self._lookups_lock:
+            self._lookups.clear()
+
+    def _urls_parts(self, entries, metadata):
+        # entries are (url, (path, parts[, metadata])) tuples
+        dic = defaultdict(list)
+
+        # group parts by url
+        for url, entry in entries:
+            dic[url].append(entry[1:])
+
+        # and sort
+        dic = {url: sorted(parts, key=lambda x: x[0]) for url, parts in dic.items()}
+
+        if metadata:
+            return [
+                (url, [p[0] for p in parts], [p[1] for p in parts])
+                for url, parts in dic.items()
+            ]
+
+        return [(url, [p[0] for p in parts]) for url, parts in dic.items()]
 
 
 class GlobalIndex(Index):
@@ -28,31 +104,37 @@ class GlobalIndex(Index):
         This unique index is found at "index_location"
         The path of each file is written in the index as a relative path.
         It is relative to a base url: "baseurl".
+
+        If "index_location" ends with ".manifest", it is a text file listing
+        the locations of index segments, one per line. New segments can be
+        appended to the manifest as the archive grows, and `refresh()` only
+        downloads the new ones.
         """
 
         super().__init__(backend=backend)
         self.baseurl = baseurl
-        # if is url index_location
-        #   download index_location
-        self.backend = self._backend_constructor(index_location)
+        if index_location.endswith(MANIFEST_EXTENSION):
+            self.backend = SegmentedIndexBackend(
+                index_location,
+                self._backend_constructor,
+            )
+        else:
+            self.backend = self._backend_constructor(index_location)
 
     def get_backend(self, url=None):
         return self.backend
 
-    def lookup_request(self, request):
-        dic = defaultdict(list)
-
-        # group parts by url
-        for path, parts in self.backend.lookup(request):
-            url = f"{self.baseurl}/{path}"
-            dic[url].append(parts)
-
-        # and sort
-        dic = {url: sorted(parts) for url, parts in dic.items()}
-
-        urls_parts = [(k, v) for k, v in dic.items()]
+    def refresh(self):
+        if isinstance(self.backend, SegmentedIndexBackend):
+            self.backend.refresh()
+            self.invalidate()
 
-        return urls_parts
+    def _lookup_request(self, request, metadata=False):
+        entries = [
+            (f"{self.baseurl}/{entry[0]}", entry)
+            for entry in self.backend.lookup(request, metadata=metadata)
+        ]
+        return self._urls_parts(entries, metadata)
 
 
 class PerUrlIndex(Index):
@@ -92,6 +174,14 @@ class PerUrlIndex(Index):
             url = url.rsplit(".", 1)[0]
         return url + self.index_extension
 
+    def refresh(self, url=None):
+        """Read the index of `url` (or of all the urls used so far) again
+        on the next lookup."""
+        urls = list(self.backends) if url is None else [url]
+        for u in urls:
+            self.get_backend(u).refresh()
+        self.invalidate()
+
     def get_backend(self, url):
         if url in self.backends:
             return self.backends[url]
@@ -103,32 +193,26 @@ class PerUrlIndex(Index):
         self.backends[url] = backend
         return self.backends[url]
 
-    def lookup_request(self, request):
-        dic = defaultdict(list)
-
+    def _lookup_request(self, request, metadata=False):
         pattern = Pattern(self.pattern, ignore_missing_keys=True)
         urls = pattern.substitute(**request)
         if not isinstance(urls, list):
             urls = [urls]
 
-        request = dict(**request)  # deepcopy to avoid changing the user's request
         for used in pattern.names:
             # consume arguments used by Pattern to build the urls
             # This is to avoid keeping them on the request
             request.pop(used)
 
-        # group parts by url
-        for url in urls:
-            backend = self.get_backend(url)
-            for _, parts in backend.lookup(request):
-                dic[url].append(parts)
-
-        # and sort
-        dic = {url: sorted(parts) for url, parts in dic.items()}
+        entries = []
+        for url, lookup in zip(urls, self._lookup_urls(urls, request, metadata)):
+            entries.extend((url, entry) for entry in lookup)
 
-        urls_parts = [(k, v) for k, v in dic.items()]
+        return self._urls_parts(entries, metadata)
 
-        return urls_parts
+    def _lookup_urls(self, urls, request, metadata):
+        backends = [self.get_backend(url) for url in urls]
+        return lookup_backends(backends, request, metadata=metadata)
 
     def __repr__(self) -> str:
         return f"PerUrlIndex(pattern={self.pattern})"
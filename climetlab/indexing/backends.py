@@ -7,17 +7,96 @@
 # nor does it submit to any jurisdiction.
 #
 
+import logging
+import os
+import threading
+from urllib.parse import urljoin
 
-from .database import SqlDatabase
+from climetlab.core.settings import SETTINGS
+from climetlab.core.thread import SoftThreadPool
+
+from .database import SqlDatabase, get_iterator_and_size
+
+LOG = logging.getLogger(__name__)
+
+
+def lookup_backends(backends, request, metadata=False):
+    # The first lookup on a backend downloads and converts its index,
+    # so the backends are queried in parallel.
+    nthreads = min(SETTINGS.get("number-of-download-threads"), len(backends))
+    if nthreads < 2:
+        return [b.lookup(request, metadata=metadata) for b in backends]
+
+    with SoftThreadPool(nthreads=nthreads) as pool:
+        futures = [pool.submit(b.lookup, request, metadata=metadata) for b in backends]
+        return [f.result() for f in futures]
+
+
+def read_manifest(location):
+    """Returns the locations of the segments listed in a manifest, one per line.
+    Relative locations are relative to the manifest."""
+    iterator, _ = get_iterator_and_size(location)
+
+    segments = []
+    for line in iterator:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if os.path.exists(location):
+            line = os.path.join(os.path.dirname(location), line)
+        else:
+            line = urljoin(location, line)
+        segments.append(line)
+    return segments
 
 
 class IndexBackend:
-    pass
+    def refresh(self):
+        pass
 
 
 class JsonIndexBackend(IndexBackend):
     def __init__(self, url):
         self.db = SqlDatabase(url=url)
 
-    def lookup(self, request):
-        return self.db.lookup(request)
+    def lookup(self, request, metadata=False):
+        return self.db.lookup(request, metadata=metadata)
+
+    def refresh(self):
+        self.db.refresh()
+
+
+class SegmentedIndexBackend(IndexBackend):
+    """Index made of append-only segments listed in a manifest. Each segment
+    is downloaded and cached separately, so that refreshing the index only
+    fetches the segments added since the last refresh."""
+
+    def __init__(self, manifest, backend):
+        self.manifest = manifest
+        self._backend_constructor = backend
+        self._lock = threading.Lock()
+        self.segments = []
+        self.backends = []
+        self.refresh()
+
+    def refresh(self):
+        segments = read_manifest(self.manifest)
+        with self._lock:
+            if segments[: len(self.segments)] != self.segments:
+                LOG.warning("Manifest %s has been rewritten, reloading", self.manifest)
+                self.segments, self.backends = [], []
+
+            for segment in segments[len(self.segments) :]:
+                self.segments.append(segment)
+                self.backends.append(self._backend_constructor(segment))
+
+    def lookup(self, request, metadata=False):
+        with self._lock:
+            backends = list(self.backends)
+
+        result = []
+        for lookup in lookup_backends(backends, request, metadata=metadata):
+            result.extend(lookup)
+        return result
@@ -11,11 +11,12 @@
 import json
 import os
 import sqlite3
+import threading
 
-import requests
 from multiurl import robust
 
 from climetlab.core.caching import cache_file
+from climetlab.core.sessions import SESSIONS
 from climetlab.utils import tqdm
 
 
@@ -25,7 +26,7 @@ def get_iterator_and_size(url):
         size = os.path.getsize(url)
         return iterator, size
 
-    r = robust(requests.get)(url, stream=True)
+    r = robust(SESSIONS.get)(url, stream=True)
     r.raise_for_status()
     try:
         size = int(r.headers.get("Content-Length"))
@@ -35,6 +36,13 @@ def get_iterator_and_size(url):
     return iterator, size
 
 
+def is_sqlite_file(path):
+    if not os.path.isfile(path):
+        return False
+    with open(path, "rb") as f:
+        return f.read(16) == b"SQLite format 3\x00"
+
+
 def create_table(target, names):
     if os.path.exists(target):
         os.unlink(target)
@@ -72,21 +80,43 @@ class SqlDatabase(Database):
         create_index=False,  # index is disabled by default because it is long to create.
     ):
         self._connection = None
+        self._lock = threading.RLock()
+        self._force = False
         self.url = url
         self.create_index = create_index
 
     @property
     def connection(self):
-        if self._connection is None:
-            path = cache_file(
-                "index",
-                self.to_sql_target,
-                self.url,
-                hash_extra=self.VERSION,
-                extension=".db",
-            )
-            self._connection = sqlite3.connect(path)
-        return self._connection
+        with self._lock:
+            if self._connection is None:
+                if is_sqlite_file(self.url):
+                    # Database created by SqlDatabaseWriter, no conversion needed
+                    self._connection = sqlite3.connect(
+                        self.url, check_same_thread=False
+                    )
+                    return self._connection
+
+                path = cache_file(
+                    "index",
+                    self.to_sql_target,
+                    self.url,
+                    hash_extra=self.VERSION,
+                    extension=".db",
+                    force=self._force,
+                )
+                self._force = False
+                # The connection may be created in a download thread
+                # and used later from another one.
+                self._connection = sqlite3.connect(path, check_same_thread=False)
+            return self._connection
+
+    def refresh(self):
+        """Read the index again, and rebuild its database, on the next lookup."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._force = True
 
     def to_sql_target(self, target, url):
         iterator, size = get_iterator_and_size(url)
@@ -137,7 +167,7 @@ class SqlDatabase(Database):
         connection.execute("COMMIT;")
         connection.close()
 
-    def lookup(self, request):
+    def lookup(self, request, metadata=False):
         conditions = []
         for k, b in request.items():
             if isinstance(b, (list, tuple)):
@@ -149,9 +179,96 @@ class SqlDatabase(Database):
             else:
                 conditions.append(f"i_{k}='{b}'")
 
-        statement = f"SELECT path,offset,length FROM entries WHERE {' AND '.join(conditions)} ORDER BY offset;"
+        columns = "*" if metadata else "path,offset,length"
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        statement = f"SELECT {columns} FROM entries {where} ORDER BY path, offset;"
 
         parts = []
-        for path, offset, length in self.connection.execute(statement):
-            parts.append((path, (offset, length)))
+        with self._lock:
+            cursor = self.connection.execute(statement)
+            names = [d[0] for d in cursor.description]
+            for row in cursor:
+                entry = dict(zip(names, row))
+                part = (entry["path"], (entry["offset"], entry["length"]))
+                if metadata:
+                    part += (
+                        {k[2:]: v for k, v in entry.items() if k.startswith("i_")},
+                    )
+                parts.append(part)
         return parts
+
+
+class SqlDatabaseWriter:
+    """Write index entries directly into a database that can be used by `SqlDatabase`.
+    The size and modification time of each indexed file are recorded, so that
+    unchanged files can be skipped when the index is updated."""
+
+    def __init__(self, target):
+        self.target = target
+        self.connection = sqlite3.connect(target)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                path    TEXT,
+                offset  INTEGER,
+                length  INTEGER
+                );"""
+        )
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS files (
+                path    TEXT PRIMARY KEY,
+                size    INTEGER,
+                mtime   REAL
+                );"""
+        )
+        self.names = set(
+            row[1][2:]
+            for row in self.connection.execute("PRAGMA table_info(entries);")
+            if row[1].startswith("i_")
+        )
+
+    def up_to_date(self, path, size, mtime):
+        row = self.connection.execute(
+            "SELECT size, mtime FROM files WHERE path=?", (path,)
+        ).fetchone()
+        return row is not None and row[0] == size and row[1] == mtime
+
+    def _add_columns(self, entry):
+        for n in sorted(entry.keys()):
+            if n.startswith("_") or n in self.names:
+                continue
+            self.connection.execute(f"ALTER TABLE entries ADD COLUMN i_{n} TEXT;")
+            self.names.add(n)
+
+    def add(self, path, size, mtime, entries):
+        """Replace the entries of `path` with `entries`."""
+        with self.connection:
+            self.connection.execute("DELETE FROM entries WHERE path=?", (path,))
+            for entry in entries:
+                self._add_columns(entry)
+                names = [n for n in entry.keys() if not n.startswith("_")]
+                columns = ",".join(
+                    ["path", "offset", "length"] + [f"i_{n}" for n in names]
+                )
+                values = [path, entry["_offset"], entry["_length"]] + [
+                    entry[n] for n in names
+                ]
+                commas = ",".join(["?" for _ in values])
+                self.connection.execute(
+                    f"INSERT INTO entries({columns}) VALUES({commas});",
+                    tuple(values),
+                )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO files(path, size, mtime) VALUES(?,?,?);",
+                (path, size, mtime),
+            )
+
+    def paths(self):
+        return [row[0] for row in self.connection.execute("SELECT path FROM files;")]
+
+    def remove(self, path):
+        with self.connection:
+            self.connection.execute("DELETE FROM entries WHERE path=?", (path,))
+            self.connection.execute("DELETE FROM files WHERE path=?", (path,))
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,121 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import os
+
+from climetlab.utils import tqdm
+
+from .database import SqlDatabaseWriter
+
+
+def index_grib_file(path, path_name=None):
+    import eccodes
+
+    with open(path, "rb") as f:
+
+        h = eccodes.codes_grib_new_from_file(f)
+
+        while h:
+            try:
+                field = dict()
+
+                if isinstance(path_name, str):
+                    field["_path"] = path_name
+                elif path_name is False:
+                    pass
+                elif path_name is None:
+                    field["_path"] = path
+                else:
+                    raise ValueError(f"Value of path_name cannot be '{path_name}.'")
+
+                i = eccodes.codes_keys_iterator_new(h, "mars")
+                try:
+                    while eccodes.codes_keys_iterator_next(i):
+                        name = eccodes.codes_keys_iterator_get_name(i)
+                        value = eccodes.codes_get_string(h, name)
+                        field[name] = value
+
+                finally:
+                    eccodes.codes_keys_iterator_delete(i)
+
+                field["_offset"] = eccodes.codes_get_long(h, "offset")
+                field["_length"] = eccodes.codes_get_long(h, "totalLength")
+
+                field["_param_id"] = eccodes.codes_get_string(h, "paramId")
+                field["param"] = eccodes.codes_get_string(h, "shortName")
+
+                yield field
+
+            finally:
+                eccodes.codes_release(h)
+
+            h = eccodes.codes_grib_new_from_file(f)
+
+
+def list_files(path):
+    if os.path.isdir(path):
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                yield os.path.join(root, name)
+    else:
+        yield path
+
+
+def _index_task(task):
+    # Run in a worker process
+    path, path_name = task
+    stat = os.stat(path)
+    entries = list(index_grib_file(path, path_name=path_name))
+    return path, path_name, stat.st_size, stat.st_mtime, entries
+
+
+def run_tasks(tasks, workers):
+    if workers < 2:
+        for task in tqdm(tasks, desc="Indexing", unit="file", leave=False):
+            yield _index_task(task)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(_index_task, tasks, chunksize=4)
+        yield from tqdm(
+            results, desc="Indexing", unit="file", total=len(tasks), leave=False
+        )
+
+
+def _name(path, path_name):
+    return path_name if isinstance(path_name, str) else path
+
+
+def update_database(target, tasks, workers=1, remove_missing=False):
+    """Index the GRIB files of `tasks` (a list of (path, path_name) tuples)
+    into the database `target`, skipping files that have not changed since
+    they were last indexed. Returns the number of files (indexed, up-to-date)."""
+
+    db = SqlDatabaseWriter(target)
+    try:
+        todo = []
+        for path, path_name in tasks:
+            stat = os.stat(path)
+            if not db.up_to_date(_name(path, path_name), stat.st_size, stat.st_mtime):
+                todo.append((path, path_name))
+
+        for path, path_name, size, mtime, entries in run_tasks(todo, workers):
+            db.add(_name(path, path_name), size, mtime, entries)
+
+        if remove_missing:
+            names = set(_name(path, path_name) for path, path_name in tasks)
+            for name in db.paths():
+                if name not in names:
+                    db.remove(name)
+
+        return len(todo), len(tasks) - len(todo)
+    finally:
+        db.close()
@@ -0,0 +1,198 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from multiurl.heuristics import Part, parts_heuristics
+
+from climetlab.core.scheduler import host_of
+from climetlab.core.settings import DOT_CLIMETLAB
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_METHOD = "auto"
+
+# Older observations are progressively forgotten, so that the
+# planner follows the changes in server performances
+DECAY = 0.9
+
+# Number of transfers to observe before trusting the model
+MINIMUM_OBSERVATIONS = 3
+
+
+def candidate_methods():
+    methods = [DEFAULT_METHOD]
+    for i in [1, 5, 10, 50, 100]:
+        methods.append(f"cluster({i})")
+    for i in [10, 100]:
+        for j in [12, 16, 20, 24]:
+            methods.append(f"cluster({i})|blocked({2**j})")
+    for i in range(8, 25, 4):
+        methods.append(f"blocked({2**i})")
+    return methods
+
+
+def _ignore_statistics(*args, **kwargs):
+    pass
+
+
+class HostModel:
+    """Least-square model of the time needed to download byte ranges from a host:
+
+    elapsed = latency * number_of_ranges + size / bandwidth
+    """
+
+    NAMES = ("count", "nn", "nb", "bb", "en", "eb")
+
+    def __init__(self, **kwargs):
+        for n in self.NAMES:
+            setattr(self, n, kwargs.get(n, 0.0))
+
+    def update(self, nranges, size, elapsed):
+        for n in self.NAMES:
+            setattr(self, n, getattr(self, n) * DECAY)
+
+        self.count += 1
+        self.nn += nranges * nranges
+        self.nb += nranges * size
+        self.bb += size * size
+        self.en += elapsed * nranges
+        self.eb += elapsed * size
+
+    def coefficients(self):
+        """Returns (seconds per range, seconds per byte), or None
+        if not enough is known about the host."""
+
+        if self.count < MINIMUM_OBSERVATIONS:
+            return None
+
+        det = self.nn * self.bb - self.nb * self.nb
+        if det <= 1e-12 * self.nn * self.bb:
+            # All observations are alike, split the cost evenly
+            if self.nn == 0 or self.bb == 0:
+                return None
+            return (0.5 * self.en / self.nn, 0.5 * self.eb / self.bb)
+
+        latency = (self.en * self.bb - self.eb * self.nb) / det
+        per_byte = (self.eb * self.nn - self.en * self.nb) / det
+        return (max(latency, 0.0), max(per_byte, 0.0))
+
+    def as_dict(self):
+        return {n: getattr(self, n) for n in self.NAMES}
+
+
+class RangePlanner:
+    """Learn per-host latency and bandwidth from the "byte-ranges" and
+    "transfer" statistics events of url downloads, and select the
+    `range_method` that minimises the expected download time."""
+
+    def __init__(self, path=None, methods=None):
+        self.path = path
+        self.methods = methods if methods is not None else candidate_methods()
+        self._lock = threading.RLock()
+        self._models = None
+        self._pending = {}
+
+    @property
+    def models(self):
+        with self._lock:
+            if self._models is None:
+                self._models = self._load()
+            return self._models
+
+    def _load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return {k: HostModel(**v) for k, v in json.load(f).items()}
+        except Exception:
+            LOG.warning("Cannot load range planner statistics %s", self.path)
+            return {}
+
+    def _save(self):
+        if self.path is None:
+            return
+        try:
+            # Other processes may be saving their statistics at the same time
+            fd, tmp = tempfile.mkstemp(
+                dir=os.path.dirname(self.path),
+                prefix=os.path.basename(self.path),
+                suffix=".tmp",
+            )
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump({k: v.as_dict() for k, v in self.models.items()}, f)
+                os.replace(tmp, self.path)
+            except Exception:
+                os.unlink(tmp)
+                raise
+        except Exception:
+            LOG.warning("Cannot save range planner statistics %s", self.path)
+
+    def observe(self, name, **values):
+        with self._lock:
+            if name == "byte-ranges":
+                self._pending[values["url"]] = values["blocks"]
+                return
+
+            if name == "transfer":
+                blocks = self._pending.pop(values["url"], None)
+                if blocks is None:
+                    # Not a byte-range transfer
+                    return
+                self.add_observation(
+                    values["url"],
+                    len(blocks),
+                    values["total"],
+                    values["elapsed"],
+                )
+
+    def add_observation(self, url, nranges, size, elapsed):
+        with self._lock:
+            host = host_of(url)
+            if host not in self.models:
+                self.models[host] = HostModel()
+            self.models[host].update(nranges, size, elapsed)
+            self._save()
+
+    def estimate(self, url, blocks):
+        with self._lock:
+            model = self.models.get(host_of(url))
+            coefficients = model.coefficients() if model else None
+        if coefficients is None:
+            return None
+        latency, per_byte = coefficients
+        return latency * len(blocks) + per_byte * sum(b[1] for b in blocks)
+
+    def range_method(self, url, parts):
+        """Returns the range method with the smallest expected download time."""
+        if not parts:
+            return DEFAULT_METHOD
+
+        parts = [Part(offset, length) for offset, length in parts]
+
+        best, best_time = DEFAULT_METHOD, None
+        for method in self.methods:
+            blocks = parts_heuristics(method, _ignore_statistics)(parts)
+            expected = self.estimate(url, blocks)
+            if expected is None:
+                return DEFAULT_METHOD
+            if best_time is None or expected < best_time:
+                best, best_time = method, expected
+
+        LOG.debug("Range method for %s: %s (%ss expected)", url, best, best_time)
+        return best
+
+
+RANGE_PLANNER = RangePlanner(os.path.join(DOT_CLIMETLAB, "range-planner.json"))
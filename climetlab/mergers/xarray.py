@@ -7,6 +7,8 @@
 # nor does it submit to any jurisdiction.
 #
 
+import itertools
+
 import xarray as xr
 from xarray.backends.common import BackendEntrypoint
 
@@ -84,3 +86,47 @@ def merge(
         engine=CMLEngine,
         **options,
     )
+
+
+def virtual_concat(datasets, dim):
+    """Concatenates `datasets` along `dim`, sorted by the values of `dim`.
+
+    Only the coordinates of `dim` are read: the datasets are sliced lazily
+    into runs of consecutive values coming from the same dataset, and the
+    variables of these runs are concatenated one by one, without aligning
+    the datasets, so that the (dask) arrays are not loaded. When a value is
+    in several datasets, the last one is used. The variables that do not
+    depend on `dim` are taken from the first dataset.
+    """
+
+    datasets = [ds if dim in ds.dims else ds.expand_dims(dim) for ds in datasets]
+
+    where = {}
+    for i, ds in enumerate(datasets):
+        for j, value in enumerate(ds[dim].values):
+            where[value] = (i, j)
+
+    parts = []
+    for i, run in itertools.groupby(
+        (where[value] for value in sorted(where)), key=lambda x: x[0]
+    ):
+        positions = [j for _, j in run]
+        if positions == list(range(positions[0], positions[-1] + 1)):
+            positions = slice(positions[0], positions[-1] + 1)
+        parts.append(datasets[i].isel({dim: positions}))
+
+    if len(parts) == 1:
+        return parts[0]
+
+    first = parts[0]
+    variables = {}
+    for name, variable in first.variables.items():
+        if dim in variable.dims:
+            variable = xr.Variable.concat([p.variables[name] for p in parts], dim)
+        variables[name] = variable
+
+    return xr.Dataset(
+        {name: variables[name] for name in first.data_vars},
+        coords={name: variables[name] for name in first.coords},
+        attrs=first.attrs,
+    )
@@ -19,7 +19,7 @@ class MirrorConnection:
         self.mirror = mirror
         self.source = source
 
-    def get_file(self, create, args):
+    def get_file(self, create, args, **kwargs):
         if self.resource():
             LOG.debug(
                 f"Found a copy of {self.source} in mirror {self.mirror}: {self.resource()}."
@@ -29,13 +29,16 @@ class MirrorConnection:
             LOG.debug(f"No copy of {self.source} into {self.mirror}: prefetch=False.")
             return None
         LOG.info(f"Building mirror for {self.source} in mirror {self.mirror}.")
-        return self.create_copy(create, args)
+        path = self.create_copy(create, args, **kwargs)
+        if path is not None:
+            self.mirror.copied(path)
+        return path
 
     def resource(self):
         LOG.info(f"Not implemented. {self.source} not in mirror {self.mirror}.")
         return None
 
-    def create_copy(self, create, args):
+    def create_copy(self, create, args, **kwargs):
         LOG.info(
             f"Not implemented. Not creating anything for {self.source} in mirror {self.mirror}."
         )
@@ -45,6 +48,7 @@ class MirrorConnection:
 class BaseMirror:
 
     _prefetch = False
+    _copy_callbacks = ()
 
     def __enter__(self):
         self.activate(prefetch=self._prefetch)
@@ -67,6 +71,17 @@ class BaseMirror:
         global _MIRRORS
         _MIRRORS.remove(self)
 
+    def on_copy(self, callback):
+        """Calls `callback` with the path of each file added to the mirror."""
+        self._copy_callbacks = list(self._copy_callbacks) + [callback]
+
+    def remove_on_copy(self, callback):
+        self._copy_callbacks = [c for c in self._copy_callbacks if c != callback]
+
+    def copied(self, path):
+        for callback in self._copy_callbacks:
+            callback(path)
+
     # convenience method for testing purposes
     def contains(self, source):
         return source.connect_to_mirror(self).resource() is not None
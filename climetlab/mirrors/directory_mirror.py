@@ -6,14 +6,18 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 #
+import hashlib
 import inspect
+import json
 import logging
 import os
 from urllib.parse import urlparse
 
+from climetlab.core.caching import cache_file, cache_path
 from climetlab.sources.ecmwf_open_data import EODRetriever
 from climetlab.sources.file import FileSource
 from climetlab.sources.url import Url
+from climetlab.utils.files import extract_parts, materialise
 
 from . import BaseMirror, MirrorConnection
 
@@ -51,8 +55,7 @@ class DirectoryMirror(BaseMirror):
         if not url.startswith(self.origin_prefix):
             return None
         if parts:
-            # return DirectoryMirrorConnectionForUrlWithPargs(self, source, url, parts)
-            return None
+            return DirectoryMirrorConnectionForUrlWithParts(self, source, parts)
         return DirectoryMirrorConnectionForUrl(self, source)
 
     def connection_for_eod(self, source):
@@ -82,10 +85,17 @@ class DirectoryMirrorConnectionForFile(DirectoryMirrorConnection):
         else:
             return None
 
-    def create_copy(self, create, args):
+    def create_copy(self, create, args, hash_extra=None, extension=".cache", **kwargs):
         path = self._realpath()
         os.makedirs(os.path.dirname(path), exist_ok=True)
-        create(path, args)
+
+        cached = cache_path(self.source._cache_owner(), args, hash_extra, extension)
+        if kwargs.get("force") is not True and os.path.exists(cached):
+            # Already downloaded, the mirror shares the file of the cache
+            LOG.debug(f"Linking {cached} into mirror {self.mirror}.")
+            materialise(cached, path)
+        else:
+            create(path, args)
         return path
 
 
@@ -117,3 +127,44 @@ class DirectoryMirrorConnectionForUrl(DirectoryMirrorConnectionForFile):
         url = urlparse(url)
         keys = [url.scheme, f"{url.netloc}/{url.path}"]
         return ["url"] + keys
+
+
+class DirectoryMirrorConnectionForUrlWithParts(DirectoryMirrorConnectionForUrl):
+    """The parts of an url are either found in the mirror as a partial object,
+    i.e. the concatenation of the parts, stored next to the full file, or
+    extracted into the cache from the full file, if it is in the mirror."""
+
+    def __init__(self, mirror: DirectoryMirror, source: Url, parts):
+        self.parts = parts
+        return super().__init__(mirror, source)
+
+    def _to_keys(self):
+        keys = super()._to_keys()
+        m = hashlib.sha256(json.dumps(self.parts).encode("utf-8"))
+        return keys[:-1] + [f"{keys[-1]}.parts-{m.hexdigest()}"]
+
+    def _full_file(self):
+        path = os.path.join(self.mirror.path, *super()._to_keys())
+        path = os.path.realpath(path)
+        return path if os.path.exists(path) else None
+
+    def get_file(self, create, args, **kwargs):
+        full = self._full_file()
+        if self.resource() is None and full is not None:
+            LOG.debug(
+                f"Extracting {len(self.parts)} part(s) of {self.source} from {full}."
+            )
+
+            def extract(target, args):
+                extract_parts(full, self.parts, target)
+
+            def out_of_date(args, path, owner_data):
+                # As for the files found in the mirror, the origin is not
+                # checked, only the copy of the file in the mirror
+                return os.path.getmtime(path) < os.path.getmtime(full)
+
+            if callable(kwargs.get("force")):
+                kwargs["force"] = out_of_date
+            return cache_file(self.source._cache_owner(), extract, args, **kwargs)
+
+        return super().get_file(create, args, **kwargs)
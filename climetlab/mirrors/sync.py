@@ -0,0 +1,141 @@
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+import logging
+import os
+import threading
+import time
+
+import yaml
+
+from climetlab.core.thread import SoftThreadPool
+from climetlab.utils import humanize
+from climetlab.utils.patterns import Pattern
+
+LOG = logging.getLogger(__name__)
+
+
+def load_manifest(manifest):
+    """Returns the list of entries of `manifest`, a list or the path of a YAML
+    or JSON file containing a list. Each entry is either:
+
+    - an url, or a dictionary with an ``url`` and the other options of the
+      ``url`` source (e.g. ``parts``),
+    - a dictionary with a ``pattern`` and the values used to expand it, as for
+      the ``url-pattern`` source,
+    - a dictionary with the name of a ``source``, its positional ``args`` and
+      the other keys of the request (e.g. for ``ecmwf-open-data``).
+    """
+    if isinstance(manifest, str):
+        with open(manifest) as f:
+            manifest = yaml.load(f, Loader=yaml.SafeLoader)
+
+    if not isinstance(manifest, list):
+        raise ValueError(f"A mirror manifest must be a list, not {manifest!r}")
+
+    entries = []
+    for entry in manifest:
+        if isinstance(entry, str):
+            entry = dict(url=entry)
+
+        if not isinstance(entry, dict):
+            raise ValueError(f"Invalid mirror manifest entry {entry!r}")
+
+        entry = dict(entry)
+        if "pattern" in entry:
+            urls = Pattern(entry.pop("pattern")).substitute(**entry)
+            if not isinstance(urls, list):
+                urls = [urls]
+            entries.extend(dict(url=url) for url in urls)
+            continue
+
+        if "url" not in entry and "source" not in entry:
+            raise ValueError(f"Invalid mirror manifest entry {entry!r}")
+
+        entries.append(entry)
+
+    return entries
+
+
+class SyncReport:
+    def __init__(self, entries):
+        self.entries = entries
+        self.files = 0
+        self.bytes = 0
+        self.errors = []
+        self.start = time.time()
+        self.end = None
+        self._lock = threading.Lock()
+
+    def copied(self, path):
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+
+    def failed(self, entry, error):
+        with self._lock:
+            self.errors.append((entry, error))
+
+    @property
+    def elapsed(self):
+        return (time.time() if self.end is None else self.end) - self.start
+
+    @property
+    def throughput(self):
+        return self.bytes / self.elapsed if self.elapsed > 0 else 0
+
+    def __repr__(self):
+        return (
+            f"{self.files} file(s) downloaded for {self.entries} entries,"
+            f" {humanize.bytes(self.bytes)} in {humanize.seconds(self.elapsed)}"
+            f" ({humanize.bytes(self.throughput)}/s), {len(self.errors)} error(s)"
+        )
+
+
+def _load(entry):
+    from climetlab import load_source
+
+    entry = dict(entry)
+    if "url" in entry:
+        return load_source("url", entry.pop("url"), **entry)
+
+    name = entry.pop("source")
+    args = entry.pop("args", [])
+    return load_source(name, *args, **entry)
+
+
+def sync_mirror(mirror, manifest, threads=4):
+    """Downloads the entries of `manifest` (see :func:`load_manifest`) that are
+    not yet in `mirror`, with `threads` downloads in parallel. Interrupted
+    downloads are resumed. Returns a :class:`SyncReport`, with the number of
+    files and bytes added to the mirror and the download throughput."""
+
+    entries = load_manifest(manifest)
+    report = SyncReport(len(entries))
+
+    def sync(entry):
+        try:
+            _load(entry)
+        except Exception as e:
+            LOG.error("Cannot mirror %s: %s", entry, e)
+            report.failed(entry, e)
+
+    mirror.on_copy(report.copied)
+    try:
+        with mirror.prefetch():
+            with SoftThreadPool(nthreads=threads) as pool:
+                futures = [pool.submit(sync, entry) for entry in entries]
+                for future in futures:
+                    future.result()
+    finally:
+        mirror.remove_on_copy(report.copied)
+        report.end = time.time()
+
+    LOG.info("Mirror %s: %s", mirror, report)
+    return report
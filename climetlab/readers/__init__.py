@@ -8,15 +8,20 @@
 #
 
 import logging
+import mimetypes
 import os
+import threading
 import weakref
+from collections import OrderedDict
 from importlib import import_module
 
 from climetlab.core import Base
-from climetlab.decorators import locked
+from climetlab.utils.files import materialise
 
 LOG = logging.getLogger(__name__)
 
+LOCK = threading.Lock()
+
 
 class ReaderMeta(type(Base), type(os.PathLike)):
     pass
@@ -65,6 +70,11 @@ class Reader(Base, os.PathLike, metaclass=ReaderMeta):
         return self.source.cache_file(*args, **kwargs)
 
     def save(self, path):
+        if type(self).write is Reader.write:
+            # The file is saved as it is
+            materialise(self.path, path, link=False)
+            return
+
         mode = "wb" if self.binary else "w"
         with open(path, mode) as f:
             self.write(f)
@@ -84,35 +94,115 @@ class Reader(Base, os.PathLike, metaclass=ReaderMeta):
         return self.path
 
 
-_READERS = {}
+# Readers are found from the first bytes of the files, or from their names,
+# without importing the modules of the other readers. A module listed here
+# has a `reader(source, path, magic, deeper_check)` function that returns
+# None if the file is not of its format.
+MAGICS = (
+    (b"BUFR", "bufr"),
+    (b"GRIB", "grib"),
+    (b"\x89HDF", "netcdf"),
+    (b"CDF\x01", "netcdf"),
+    (b"CDF\x02", "netcdf"),
+    (b"\x93NUMPY", "numpy"),
+    (b"\xff\xffODA", "odb"),
+    (b"PK\x03\x04", "numpy"),  # .npz
+    (b"PK\x03\x04", "zip"),
+)
+
+MIMETYPES = {
+    "text/csv": "csv",
+    "application/x-tar": "tar",
+}
+
+EXTENSIONS = {
+    ".tfrecord": "tfrecord",
+}
+
+# Readers that look deeper into the files, when no other reader is found
+DEEPER_CHECKS = ("text",)
+
+ALIASES = {
+    "fix_width_format": "fwf",
+}
+
+# Readers found for (path, size, mtime)
+_DETECTED = OrderedDict()
+_MAXIMUM_DETECTED = 100000
+
 
+def _reader_module(name):
+    name = ALIASES.get(name, name)
+    return import_module(f".{name}", package=__name__)
 
-# TODO: Add plugins
-@locked
-def _readers():
-    if not _READERS:
-        here = os.path.dirname(__file__)
-        for path in sorted(os.listdir(here)):
 
-            if path[0] in ("_", "."):
-                continue
+def _reader_function(name):
+    return _reader_module(name).reader
 
-            if path.endswith(".py") or os.path.isdir(os.path.join(here, path)):
 
-                name, _ = os.path.splitext(path)
+def _candidates(path, magic):
+    """Names of the modules of the readers that may read `path`, in the
+    order in which they are tried."""
+    names = set(name for prefix, name in MAGICS if magic.startswith(prefix))
 
-                try:
-                    module = import_module(f".{name}", package=__name__)
-                    if hasattr(module, "reader"):
-                        _READERS[name] = module.reader
-                        if hasattr(module, "aliases"):
-                            for a in module.aliases:
-                                assert a not in _READERS
-                                _READERS[a] = module.reader
-                except Exception:
-                    LOG.exception("Error loading reader %s", name)
+    kind, _ = mimetypes.guess_type(path)
+    if kind in MIMETYPES:
+        names.add(MIMETYPES[kind])
+
+    for extension, name in EXTENSIONS.items():
+        if path.endswith(extension):
+            names.add(name)
+
+    return sorted(names)
+
+
+def _remember(key, name, deeper_check, magic):
+    with LOCK:
+        _DETECTED[key] = (name, deeper_check, magic)
+        _DETECTED.move_to_end(key)
+        while len(_DETECTED) > _MAXIMUM_DETECTED:
+            _DETECTED.popitem(last=False)
+
+
+def sniff(path):
+    """Returns the first bytes of `path`, and the name of its reader if it
+    can be known from them and from the name of the file, without trying
+    the readers."""
+    with open(path, "rb") as f:
+        magic = f.read(8)
 
-    return _READERS
+    names = _candidates(path, magic)
+    return magic, names[0] if len(names) == 1 else None
+
+
+def remember(path, size, mtime_ns, name, magic):
+    """Records that the file `path` of this size and modification time (in
+    nanoseconds) is read by the reader `name`, e.g. found by a previous
+    scan, so that its format is not detected again when it is opened."""
+    _remember((path, size, mtime_ns), name, False, magic)
+
+
+def index_path(name, path, stat=None):
+    """Path of the index that the reader `name` keeps in the cache for `path`,
+    or None if it does not index its files."""
+    function = getattr(_reader_module(name), "index_path", None)
+    if function is None:
+        return None
+    return function(path, stat)
+
+
+def _detect(source, path, magic):
+    for name in _candidates(path, magic):
+        reader = _reader_function(name)(source, path, magic, False)
+        if reader is not None:
+            return name, False, reader
+
+    for name in DEEPER_CHECKS:
+        reader = _reader_function(name)(source, path, magic, True)
+        if reader is not None:
+            return name, True, reader
+
+    return None, False, None
 
 
 def reader(source, path):
@@ -125,7 +215,7 @@ def reader(source, path):
         if callable(reader):
             return reader(source, path)
         if isinstance(reader, str):
-            return _readers()[reader.replace("-", "_")](source, path, None, False)
+            return _reader_function(reader.replace("-", "_"))(source, path, None, False)
 
         raise TypeError(
             "Provided reader must be a callable or a string, not %s" % type(reader)
@@ -137,18 +227,36 @@ def reader(source, path):
         return DirectoryReader(source, path).mutate()
     LOG.debug("Reader for %s", path)
 
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+
+    with LOCK:
+        detected = _DETECTED.get(key)
+        if detected is not None:
+            _DETECTED.move_to_end(key)
+
+    if detected is not None:
+        name, deeper_check, magic = detected
+        LOG.debug("Reader for %s already found (%s)", path, name)
+        if name is None:
+            from .unknown import Unknown
+
+            return Unknown(source, path, magic)
+
+        reader = _reader_function(name)(source, path, magic, deeper_check)
+        if reader is not None:
+            return reader.mutate()
+
     with open(path, "rb") as f:
         magic = f.read(8)
 
     LOG.debug("Looking for a reader for %s (%s)", path, magic)
 
-    for deeper_check in (False, True):
-        # We do two passes, the second one
-        # allow the plugin to look deeper in the file
-        for name, r in _readers().items():
-            reader = r(source, path, magic, deeper_check)
-            if reader is not None:
-                return reader.mutate()
+    name, deeper_check, reader = _detect(source, path, magic)
+    _remember(key, name, deeper_check, magic)
+
+    if reader is not None:
+        return reader.mutate()
 
     from .unknown import Unknown
 
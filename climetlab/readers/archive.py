@@ -7,18 +7,46 @@
 # nor does it submit to any jurisdiction.
 #
 
+import json
 import logging
 import os
 
-from climetlab.utils import tqdm
+from climetlab import load_source
+from climetlab.core.caching import auxiliary_cache_file, cache_file
+from climetlab.utils.files import extract_parts
 
-from . import Reader
+from . import Reader, _candidates
 from . import reader as find_reader
+from .directory import make_file_filter
 
 LOG = logging.getLogger(__name__)
 
 
+def _extension(name):
+    # Same as the extension of downloaded files, e.g. '.csv.gz'
+    base = os.path.basename(name)
+    extensions = []
+    while True:
+        base, ext = os.path.splitext(base)
+        if not ext:
+            break
+        extensions.append(ext)
+    return "".join(reversed(extensions)) or ".unknown"
+
+
 class ArchiveReader(Reader):
+    """Base class of the readers of archives. The members of the archive are
+    listed once, in an index kept in the cache, and only the members selected
+    by the `filter` of the source are read. Members stored without compression
+    have an ``offset`` in the index: the GRIB ones are read directly from the
+    archive, and the others are copied by the kernel. The other members are
+    extracted in the cache, each in its own file, when the source is created.
+    """
+
+    # Name of the index in the cache
+    INDEX = None
+    VERSION = 1
+
     def __init__(self, source, path):
         super().__init__(source, path)
 
@@ -48,27 +76,144 @@ class ArchiveReader(Reader):
 
         return True
 
+    def cache_file(self, create, args, **kwargs):
+        # The files extracted from the archive are not in the mirrors
+        # of the source, which only hold the archive
+        return cache_file(self.source._cache_owner(), create, args, **kwargs)
+
     def mutate(self):
         if os.path.isdir(self.path):
             return find_reader(self.source, self.path).mutate()
 
         return self
 
-    def expand(self, archive, members, **kwargs):
+    def expand(self, members, complete=True):
+        """Extracts the `members` (entries of the index) into a directory of
+        the cache, in one pass over the archive. If the archive is not
+        `complete`, the directory only holds these members."""
+
         def unpack(target, args):
             try:
                 os.mkdir(target)
             except FileExistsError:
                 pass
 
-            for member in tqdm(iterable=members, total=len(members), leave=False):
-                if not self.check(member):
-                    continue
-                archive.extract(member=member, path=target, **kwargs)
+            self.extract_all(members, target)
+
+        args = self.path
+        if not complete:
+            args = dict(path=self.path, members=sorted(m["name"] for m in members))
 
         self.path = self.cache_file(
             unpack,
-            self.path,
+            args,
             extension=".d",
-            replace=self.path,
+            replace=self.path if complete else None,
+        )
+
+    def scan(self):
+        """Returns the files of the archive, as a list of dictionaries with
+        the ``name`` and ``size`` of each member and, if it is stored without
+        compression, its ``offset`` in the archive."""
+        raise NotImplementedError()
+
+    def extract(self, member, target):
+        """Writes the content of `member` (an entry of the index) into `target`."""
+        raise NotImplementedError()
+
+    def extract_all(self, members, target):
+        """Extracts the `members` into the directory `target`."""
+        raise NotImplementedError()
+
+    def index(self):
+        cache = auxiliary_cache_file(
+            self.INDEX,
+            self.path,
+            content="null",
+            extension=".json",
+        )
+
+        try:
+            with open(cache) as f:
+                index = json.load(f)
+            if isinstance(index, dict) and index["version"] == self.VERSION:
+                return index["members"]
+        except Exception:
+            LOG.exception("Load from cache failed %s", cache)
+
+        # As when extracting the archive, the last member of a name is used
+        members = list({m["name"]: m for m in self.scan()}.values())
+
+        try:
+            with open(cache, "w") as f:
+                json.dump(dict(version=self.VERSION, members=members), f)
+        except Exception:
+            LOG.exception("Write to cache failed %s", cache)
+
+        return members
+
+    def selected(self, members):
+        # The filter sees the members as the files of a directory
+        filter = make_file_filter(self.filter, self.path)
+        return [m for m in members if filter(os.path.join(self.path, m["name"]))]
+
+    def sources(self, members):
+        """Returns the sources of the `members`: the GRIB members stored without
+        compression are read from the archive, the other ones are given as
+        callables that extract them, which `multi` calls in parallel."""
+        from .grib.fieldset import FieldSet
+
+        result = []
+        with open(self.path, "rb") as f:
+            for member in members:
+                if member.get("offset") is not None:
+                    f.seek(member["offset"])
+                    magic = f.read(min(8, member["size"]))
+                    if _candidates(member["name"], magic) == ["grib"]:
+                        LOG.debug("Reading %s from %s", member["name"], self.path)
+                        region = (self.path, member["offset"], member["size"])
+                        result.append(FieldSet(regions=[region]))
+                        continue
+
+                result.append(self._extractor(member))
+
+        return result
+
+    def _extractor(self, member):
+        stat = os.stat(self.path)
+        key = dict(
+            path=self.path,
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            member=member["name"],
+        )
+
+        def create(target, args):
+            LOG.debug("Extracting %s from %s", member["name"], self.path)
+            if member.get("offset") is not None:
+                extract_parts(self.path, [(member["offset"], member["size"])], target)
+            else:
+                self.extract(member, target)
+
+        def extract(*args, **kwargs):
+            path = self.cache_file(create, key, extension=_extension(member["name"]))
+            return load_source("file", path, filter=self.filter, merger=self.merger)
+
+        return extract
+
+    def mutate_source(self):
+        members = self.selected(self.index())
+        LOG.debug("%s: %s member(s) selected", self.path, len(members))
+
+        sources = self.sources(members)
+        if len(sources) == 1:
+            # As for directories, a single file is used as it is
+            source = sources[0]
+            return source() if callable(source) else source
+
+        return load_source(
+            "multi",
+            sources,
+            filter=self.filter,
+            merger=self.merger,
         )
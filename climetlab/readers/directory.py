@@ -13,6 +13,8 @@ import os
 import shutil
 
 from climetlab import load_source
+from climetlab.core.manifest import DirectoryManifest
+from climetlab.utils.files import materialise
 
 from . import Reader
 from . import reader as find_reader
@@ -48,16 +50,14 @@ class DirectoryReader(Reader):
     def __init__(self, source, path):
         super().__init__(source, path)
 
-        self._content = []
-
-        filter = make_file_filter(self.filter, self.path)
+        manifest = DirectoryManifest(
+            self.path,
+            filter=make_file_filter(self.filter, self.path),
+        )
+        # The files are opened without detecting their format again
+        manifest.remember()
 
-        for root, _, files in os.walk(self.path):
-            for file in files:
-                full = os.path.join(root, file)
-                LOG.debug("%s", full)
-                if filter(full):
-                    self._content.append(full)
+        self._content = manifest.files()
 
     def mutate(self):
         if len(self._content) == 1:
@@ -77,14 +77,18 @@ class DirectoryReader(Reader):
                     filter=self.filter,
                     merger=self.merger,
                 )
-                for path in sorted(self._content)
+                for path in self._content
             ],
             filter=self.filter,
             merger=self.merger,
         )
 
     def save(self, path):
-        shutil.copytree(self.path, path)
+        shutil.copytree(
+            self.path,
+            path,
+            copy_function=lambda src, dst: materialise(src, dst, link=False),
+        )
 
     def write(self, f):
         raise NotImplementedError()
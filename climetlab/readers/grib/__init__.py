@@ -6,9 +6,14 @@
 # granted to it by virtue of its status as an intergovernmental organisation
 # nor does it submit to any jurisdiction.
 #
+from .codes import GribIndex
 from .reader import GRIBReader
 
 
 def reader(source, path, magic=None, deeper_check=False):
     if magic is None or magic[:4] == b"GRIB":
         return GRIBReader(source, path)
+
+
+def index_path(path, stat=None):
+    return GribIndex.cache_path(path, stat)
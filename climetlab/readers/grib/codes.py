@@ -11,28 +11,98 @@ import datetime
 import json
 import logging
 import os
+import threading
 
 import eccodes
 
 from climetlab.core import Base
-from climetlab.core.caching import auxiliary_cache_file
+from climetlab.core.caching import auxiliary_cache_file, auxiliary_cache_path
 from climetlab.profiling import call_counter
 from climetlab.utils.bbox import BoundingBox
 
 LOG = logging.getLogger(__name__)
 
 
+# Native type of the keys of the index metadata, which are stored as strings.
+# The other keys are read from the message.
+METADATA_TYPES = dict(
+    date=int,
+    time=int,
+    step=int,
+    levelist=int,
+    number=int,
+    hdate=int,
+    fcmonth=int,
+    iteration=int,
+    channel=int,
+    ident=int,
+    instrument=int,
+    frequency=int,
+    direction=int,
+    method=int,
+    system=int,
+    diagnostic=int,
+    **{
+        "class": str,
+        "stream": str,
+        "type": str,
+        "levtype": str,
+        "expver": str,
+        "domain": str,
+        "origin": str,
+        "shortName": str,
+    },
+)
+
+
 def missing_is_none(x):
     return None if x == 2147483647 else x
 
 
+def _message_length(get):
+    """Returns the length of the GRIB message, where `get(position, count)` returns
+    the unsigned integer coded on `count` bytes at `position` in the message."""
+    length = get(4, 3)
+    edition = get(7, 1)
+
+    if edition == 1:
+        if length & 0x800000:
+            sec1len = get(8, 3)
+            flags = get(15, 1)
+            position = 8 + sec1len
+
+            if flags & (1 << 7):
+                sec2len = get(position, 3)
+                position += sec2len
+
+            if flags & (1 << 6):
+                sec3len = get(position, 3)
+                position += sec3len
+
+            sec4len = get(position, 3)
+
+            if sec4len < 120:
+                length &= 0x7FFFFF
+                length *= 120
+                length -= sec4len
+                length += 4
+
+    if edition == 2:
+        length = get(8, 8)
+
+    return length
+
+
 # This does not belong here, should be in the C library
-def _get_message_offsets(path):
+def _get_message_offsets(path, start=0, end=None):
+    # Only the messages between `start` and `end` are returned
 
     fd = os.open(path, os.O_RDONLY)
     try:
+        offset = os.lseek(fd, start, os.SEEK_SET)
 
-        def get(count):
+        def get(position, count):
+            os.lseek(fd, offset + position, os.SEEK_SET)
             buf = os.read(fd, count)
             assert len(buf) == count
             return int.from_bytes(
@@ -41,8 +111,7 @@ def _get_message_offsets(path):
                 signed=False,
             )
 
-        offset = 0
-        while True:
+        while end is None or offset + 4 <= end:
             code = os.read(fd, 4)
             if len(code) < 4:
                 break
@@ -51,40 +120,69 @@ def _get_message_offsets(path):
                 offset = os.lseek(fd, offset + 1, os.SEEK_SET)
                 continue
 
-            length = get(3)
-            edition = get(1)
+            length = _message_length(get)
+            if end is not None and offset + length > end:
+                break
 
-            if edition == 1:
-                if length & 0x800000:
-                    sec1len = get(3)
-                    os.lseek(fd, 4, os.SEEK_CUR)
-                    flags = get(1)
-                    os.lseek(fd, sec1len - 8, os.SEEK_CUR)
+            yield offset, length
+            offset = os.lseek(fd, offset + length, os.SEEK_SET)
 
-                    if flags & (1 << 7):
-                        sec2len = get(3)
-                        os.lseek(fd, sec2len - 3, os.SEEK_CUR)
+    finally:
+        os.close(fd)
 
-                    if flags & (1 << 6):
-                        sec3len = get(3)
-                        os.lseek(fd, sec3len - 3, os.SEEK_CUR)
 
-                    sec4len = get(3)
+class _IncompleteMessage(Exception):
+    pass
 
-                    if sec4len < 120:
-                        length &= 0x7FFFFF
-                        length *= 120
-                        length -= sec4len
-                        length += 4
 
-            if edition == 2:
-                length = get(8)
+class GribStreamParser:
+    """Finds the GRIB messages in data that is received incrementally,
+    e.g. from a download. Only the current incomplete message is buffered."""
 
-            yield offset, length
-            offset = os.lseek(fd, offset + length, os.SEEK_SET)
+    def __init__(self):
+        self.buffer = bytearray()
+        # Offset of the start of the buffer in the stream
+        self.offset = 0
 
-    finally:
-        os.close(fd)
+    def feed(self, data):
+        """Returns the (offset, length) of the messages completed by `data`."""
+        self.buffer += data
+        messages = []
+
+        while True:
+            start = self.buffer.find(b"GRIB")
+            if start < 0:
+                # Keep what could be the beginning of b"GRIB"
+                skip = max(0, len(self.buffer) - 3)
+                del self.buffer[:skip]
+                self.offset += skip
+                break
+
+            del self.buffer[:start]
+            self.offset += start
+
+            try:
+                length = _message_length(self._get)
+            except _IncompleteMessage:
+                break
+
+            if len(self.buffer) < length:
+                break
+
+            messages.append((self.offset, length))
+            del self.buffer[:length]
+            self.offset += length
+
+        return messages
+
+    def _get(self, position, count):
+        if len(self.buffer) < position + count:
+            raise _IncompleteMessage()
+        return int.from_bytes(
+            self.buffer[position : position + count],
+            byteorder="big",
+            signed=False,
+        )
 
 
 eccodes_codes_release = call_counter(eccodes.codes_release)
@@ -134,6 +232,8 @@ class CodesReader:
     def __init__(self, path):
         self.path = path
         self.file = open(self.path, "rb")
+        # The file may be reopened by another thread, see `reopen()`
+        self._lock = threading.Lock()
 
     def __del__(self):
         try:
@@ -141,15 +241,27 @@ class CodesReader:
         except Exception:
             pass
 
+    def reopen(self, path):
+        """Continue reading from `path`, e.g. once the file has been moved."""
+        file = open(path, "rb")
+        with self._lock:
+            previous, self.file, self.path = self.file, file, path
+        previous.close()
+
     def at_offset(self, offset):
-        self.file.seek(offset, 0)
-        return next(self)
+        with self._lock:
+            self.file.seek(offset, 0)
+            handle = self._next_handle()
+        if handle is None:
+            raise StopIteration()
+        return handle
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        handle = self._next_handle()
+        with self._lock:
+            handle = self._next_handle()
         if handle is None:
             raise StopIteration()
         return handle
@@ -166,15 +278,17 @@ class CodesReader:
         return self.file.tell()
 
     def read(self, offset, length):
-        self.file.seek(offset, 0)
-        return self.file.read(length)
+        with self._lock:
+            self.file.seek(offset, 0)
+            return self.file.read(length)
 
 
 class GribField(Base):
-    def __init__(self, reader, offset, length):
+    def __init__(self, reader, offset, length, metadata=None):
         self._reader = reader
         self._offset = offset
         self._length = length
+        self._metadata = metadata
         self._handle = None
 
     def __enter__(self):
@@ -297,6 +411,12 @@ class GribField(Base):
         # additional '.128' (in climetlab/scripts/grib.py)
         if name == "param":
             name = "paramId"
+        if self._metadata and name in self._metadata and name in METADATA_TYPES:
+            try:
+                return METADATA_TYPES[name](self._metadata[name])
+            except ValueError:
+                # e.g. a step range, use the value of the message
+                pass
         return self.handle.get(name)
 
     def __getitem__(self, name):
@@ -326,28 +446,105 @@ class GribField(Base):
 class GribIndex:
 
     VERSION = 1
-
-    def __init__(self, path):
+    OWNER = "grib-index"
+    EXTENSION = ".json"
+
+    def __init__(self, path, parts=None, metadata=None, region=None):
+        """If the file is a concatenation of known `parts` (e.g. downloaded
+        with byte ranges), the index is built from them instead of scanning
+        the file. `metadata` is an optional list of dictionaries, one per part,
+        with the keys already known for each message. If `region` is given,
+        only the messages in this (offset, length) of the file are indexed,
+        e.g. a member of an archive."""
         assert isinstance(path, str), path
         self.path = path
+        self.region = region
         self.offsets = None
         self.lengths = None
+        self.metadata = None
         self.cache = auxiliary_cache_file(
-            "grib-index",
+            self.OWNER,
             path,
+            index=0 if region is None else list(region),
             content="null",
-            extension=".json",
+            extension=self.EXTENSION,
         )
 
-        if not self._load_cache():
-            self._build_index()
+        if self._load_cache():
+            return
+
+        if parts is not None and self._index_from_parts(parts, metadata):
+            return
+
+        self._build_index()
+
+    @classmethod
+    def cache_path(cls, path, stat=None):
+        """Path of the index of `path` in the cache, which may not exist yet."""
+        return auxiliary_cache_path(cls.OWNER, path, extension=cls.EXTENSION, stat=stat)
+
+    def _index_from_parts(self, parts, metadata):
+        lengths = [length for _, length in parts]
+        if sum(lengths) != os.path.getsize(self.path):
+            LOG.warning("Parts do not match size of %s, scanning file", self.path)
+            return False
+
+        if metadata is not None:
+            assert len(metadata) == len(lengths), (len(metadata), len(lengths))
+
+        offsets = []
+        offset = 0
+        for length in lengths:
+            offsets.append(offset)
+            offset += length
+
+        # Without the metadata of each message, a part can be anything,
+        # e.g. several messages
+        if metadata is None and not self._single_messages(offsets, lengths):
+            LOG.debug("Parts are not single messages of %s, scanning file", self.path)
+            return False
+
+        self.offsets = offsets
+        self.lengths = lengths
+        self.metadata = metadata
+
+        self._save_cache()
+        return True
+
+    def _single_messages(self, offsets, lengths):
+        with open(self.path, "rb") as f:
+            for offset, length in zip(offsets, lengths):
+
+                def get(position, count, offset=offset):
+                    f.seek(offset + position)
+                    buf = f.read(count)
+                    if len(buf) != count:
+                        raise EOFError()
+                    return int.from_bytes(buf, byteorder="big", signed=False)
+
+                f.seek(offset)
+                if f.read(4) != b"GRIB":
+                    return False
+
+                try:
+                    if _message_length(get) != length:
+                        return False
+                except EOFError:
+                    return False
+
+        return True
 
     def _build_index(self):
 
         offsets = []
         lengths = []
 
-        for offset, length in _get_message_offsets(self.path):
+        region = ()
+        if self.region is not None:
+            offset, length = self.region
+            region = (offset, offset + length)
+
+        for offset, length in _get_message_offsets(self.path, *region):
             offsets.append(offset)
             lengths.append(length)
 
@@ -364,6 +561,7 @@ class GribIndex:
                         version=self.VERSION,
                         offsets=self.offsets,
                         lengths=self.lengths,
+                        metadata=self.metadata,
                     ),
                     f,
                 )
@@ -380,6 +578,7 @@ class GribIndex:
                 assert c["version"] == self.VERSION
                 self.offsets = c["offsets"]
                 self.lengths = c["lengths"]
+                self.metadata = c.get("metadata")
                 return True
         except Exception:
             LOG.exception("Load from cache failed %s", self.cache)
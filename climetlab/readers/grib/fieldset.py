@@ -85,17 +85,40 @@ class FieldsetAdapter:
 
 
 class FieldSet(Source):
-    def __init__(self, *, paths=None):
+    def __init__(self, *, paths=None, regions=None):
+        """The fields are the GRIB messages of the files `paths`, or of the
+        `regions`, a list of (path, offset, length) of parts of files."""
         self._statistics = None
         self.readers = {}
         self.fields = []
+        self.metadata = []
         if paths is not None:
             if not isinstance(paths, (list, tuple)):
                 paths = [paths]
             for path in paths:
-                index = GribIndex(path)
-                for offset, length in zip(index.offsets, index.lengths):
-                    self.fields.append((path, offset, length))
+                self._add(GribIndex(path))
+
+        if regions is not None:
+            for path, offset, length in regions:
+                self._add(GribIndex(path, region=(offset, length)))
+
+    def _add(self, index):
+        for offset, length in zip(index.offsets, index.lengths):
+            self.fields.append((index.path, offset, length))
+        if index.metadata is None:
+            self.metadata.extend([None] * len(index.offsets))
+        else:
+            self.metadata.extend(index.metadata)
+
+    @classmethod
+    def merge(cls, sources):
+        assert all(isinstance(s, FieldSet) for s in sources), sources
+
+        result = FieldSet()
+        for s in sources:
+            result.fields.extend(s.fields)
+            result.metadata.extend(s.metadata)
+        return result
 
     def reader(self, path):
         if path not in self.readers:
@@ -104,7 +127,7 @@ class FieldSet(Source):
 
     def __getitem__(self, n):
         path, offset, length = self.fields[n]
-        return GribField(self.reader(path), offset, length)
+        return GribField(self.reader(path), offset, length, self.metadata[n])
 
     def __len__(self):
         return len(self.fields)
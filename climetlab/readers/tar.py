@@ -9,23 +9,78 @@
 
 import logging
 import mimetypes
+import shutil
 import tarfile
 
+from climetlab import load_source
+from climetlab.utils import tqdm
+from climetlab.utils.files import BUFFER_SIZE
+
 from .archive import ArchiveReader
 
 LOG = logging.getLogger(__name__)
 
 
 class TarReader(ArchiveReader):
+    """The members of uncompressed archives are read from their offsets.
+    Compressed archives cannot be read from an offset, so the selected members
+    are extracted together, in one pass over the archive."""
+
+    INDEX = "tar-index"
+
     def __init__(self, source, path, compression=None):
         super().__init__(source, path)
 
-        with tarfile.open(path) as tar:
-            self.expand(
-                tar,
-                tar.getmembers(),
-                set_attrs=False,
-            )
+    def _members(self, tar, offsets):
+        members = []
+        for info in tar:
+            if not self.check(info) or not info.isfile():
+                continue
+            offset = None
+            if offsets and not info.issparse():
+                offset = info.offset_data
+            members.append(dict(name=info.name, size=info.size, offset=offset))
+        return members
+
+    def scan(self):
+        try:
+            with tarfile.open(self.path, "r:") as tar:
+                return self._members(tar, offsets=True)
+        except tarfile.ReadError:
+            pass
+
+        # Compressed
+        with tarfile.open(self.path) as tar:
+            return self._members(tar, offsets=False)
+
+    def extract(self, member, target):
+        with tarfile.open(self.path) as tar:
+            with tar.extractfile(member["name"]) as fin, open(target, "wb") as fout:
+                shutil.copyfileobj(fin, fout, BUFFER_SIZE)
+
+    def extract_all(self, members, target):
+        names = set(m["name"] for m in members)
+        with tqdm(total=len(names), leave=False) as progress:
+            with tarfile.open(self.path) as tar:
+                for info in tar:
+                    # Check again, the archive may have several members with the same name
+                    if info.name in names and self.check(info) and info.isfile():
+                        tar.extract(member=info, path=target, set_attrs=False)
+                        progress.update(1)
+
+    def mutate_source(self):
+        members = self.index()
+        if all(m["offset"] is not None for m in members):
+            return super().mutate_source()
+
+        selected = self.selected(members)
+        self.expand(selected, complete=len(selected) == len(members))
+        return load_source(
+            "file",
+            self.path,
+            filter=self.filter,
+            merger=self.merger,
+        )
 
 
 def reader(source, path, magic=None, deeper_check=False):
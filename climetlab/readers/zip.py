@@ -8,14 +8,22 @@
 #
 
 import os
+import shutil
 import stat
-from zipfile import ZipFile
+import struct
+import zlib
+from zipfile import ZIP_DEFLATED, ZIP_STORED, BadZipFile, ZipFile
 
 from climetlab import load_source
+from climetlab.utils.files import BUFFER_SIZE
 
 from .archive import ArchiveReader
 from .csv import CSVReader
 
+# Local file header: signature, versions, flags, method, time, date, crc,
+# sizes, and the lengths of the name and of the extra field
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+
 
 class InfoWrapper:
     """
@@ -41,30 +49,87 @@ class InfoWrapper:
         return self.file_or_directory and not self.isdir()
 
 
+def _data_offset(f, info):
+    # The lengths of the local header can differ from the central directory
+    f.seek(info.header_offset)
+    header = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+    if header[0] != b"PK\x03\x04":
+        raise BadZipFile(f"Bad local header for {info.filename}")
+    return info.header_offset + LOCAL_HEADER.size + header[-2] + header[-1]
+
+
 class ZIPReader(ArchiveReader):
+
+    INDEX = "zip-index"
+
     def __init__(self, source, path):
         super().__init__(source, path)
 
         self._mutate = None
 
-        with ZipFile(path, "r") as zip:
-            members = zip.infolist()
+        members = self.index()
+        self._names = [m["name"] for m in members]
 
-            if len(members) == 1:
-
-                _, ext = os.path.splitext(members[0].filename)
-                if ext in (".csv",):
-                    self._mutate = CSVReader(source, path, compression="zip")
-                    return  # Pandas can read zipped files directly
-
-            if ".zattrs" in members:
-                return  # Zarr can read zipped files directly
-
-            self.expand(zip, members)
+        if len(members) == 1:
+            _, ext = os.path.splitext(members[0]["name"])
+            if ext in (".csv",):
+                self._mutate = CSVReader(source, path, compression="zip")
+                return  # Pandas can read zipped files directly
 
     def check(self, member):
         return super().check(InfoWrapper(member))
 
+    def scan(self):
+        members = []
+        with ZipFile(self.path, "r") as zip, open(self.path, "rb") as f:
+            for info in zip.infolist():
+                if not self.check(info) or info.is_dir():
+                    continue
+
+                member = dict(name=info.filename, size=info.file_size, offset=None)
+                if not info.flag_bits & 0x1:  # Not encrypted
+                    data = _data_offset(f, info)
+                    if info.compress_type == ZIP_STORED:
+                        member["offset"] = data
+                    else:
+                        member.update(
+                            data=data,
+                            method=info.compress_type,
+                            compress_size=info.compress_size,
+                            crc=info.CRC,
+                        )
+                members.append(member)
+
+        return members
+
+    def extract(self, member, target):
+        if member.get("method") != ZIP_DEFLATED:
+            with ZipFile(self.path, "r") as zip:
+                with zip.open(member["name"]) as fin, open(target, "wb") as fout:
+                    shutil.copyfileobj(fin, fout, BUFFER_SIZE)
+            return
+
+        # Deflated members are decompressed from their offset, so that the
+        # central directory is not read again for each member
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        crc = 0
+        size = 0
+        with open(self.path, "rb") as fin, open(target, "wb") as fout:
+            fin.seek(member["data"])
+            remaining = member["compress_size"]
+            while True:
+                chunk = fin.read(min(remaining, BUFFER_SIZE))
+                remaining -= len(chunk)
+                data = decompressor.decompress(chunk) if chunk else decompressor.flush()
+                crc = zlib.crc32(data, crc)
+                size += len(data)
+                fout.write(data)
+                if not chunk:
+                    break
+
+        if crc != member["crc"] or size != member["size"]:
+            raise BadZipFile(f"Bad CRC-32 for file {member['name']!r}")
+
     def mutate(self):
 
         if self._mutate:
@@ -74,10 +139,10 @@ class ZIPReader(ArchiveReader):
 
     def mutate_source(self):
         # zarr can read data from a zip file
-        if ".zattrs" in self._content:
+        if ".zattrs" in self._names:
             return load_source("zarr", self.path)
 
-        return None
+        return super().mutate_source()
 
 
 EXTENSIONS_TO_SKIP = (".npz",)  # Numpy arrays
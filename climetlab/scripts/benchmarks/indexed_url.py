@@ -35,6 +35,7 @@ def get_methods_list():
         methods.append(f"cluster({i})")
 
     methods.append("auto")
+    methods.append("adaptive")
 
     for i in range(8, 25, 4):
         methods.append(f"blocked({2**i})")
@@ -0,0 +1,80 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+from termcolor import colored
+
+from climetlab.utils import humanize
+
+from .tools import parse_args, print_table
+
+EPILOG = """
+MANIFEST is a YAML or JSON file with a list of urls, or of dictionaries with
+either an ``url`` and the options of the ``url`` source, a ``pattern`` and the
+values to expand it, or the name of a ``source`` and its request.
+
+Example, to populate a mirror every night:
+
+   ``mirror sync manifest.yaml --path /data/mirror --threads 8``
+
+"""
+
+
+class MirrorCmd:
+    @parse_args(
+        epilog=EPILOG,
+        action=dict(metavar="ACTION", type=str, nargs="?", help="'sync'"),
+        manifest=dict(metavar="MANIFEST", type=str, nargs="?"),
+        path=dict(type=str, metavar="DIRECTORY", help="directory of the mirror"),
+        prefix=dict(
+            type=str,
+            metavar="URL",
+            default="",
+            help="origin prefix of the urls of the mirror",
+        ),
+        threads=dict(
+            type=int,
+            metavar="N",
+            default=4,
+            help="number of parallel downloads",
+        ),
+    )
+    def do_mirror(self, args):
+        """
+        Mirror command to populate a directory mirror with the entries of a
+        manifest that are not in it yet. Interrupted downloads are resumed.
+        Examples: climetlab mirror sync manifest.yaml --path /data/mirror
+        """
+        from climetlab.mirrors.directory_mirror import DirectoryMirror
+        from climetlab.mirrors.sync import sync_mirror
+
+        if args.action != "sync" or args.manifest is None or args.path is None:
+            print(
+                colored(
+                    "Usage: mirror sync MANIFEST --path DIRECTORY. Use --help for more information.",
+                    "red",
+                )
+            )
+            return
+
+        mirror = DirectoryMirror(path=args.path, origin_prefix=args.prefix)
+        report = sync_mirror(mirror, args.manifest, threads=args.threads)
+
+        print_table(
+            [
+                ("Entries:", humanize.number(report.entries)),
+                ("Files downloaded:", humanize.number(report.files)),
+                ("Bytes downloaded:", humanize.bytes(report.bytes)),
+                ("Elapsed:", humanize.seconds(report.elapsed)),
+                ("Throughput:", f"{humanize.bytes(report.throughput)}/s"),
+                ("Errors:", humanize.number(len(report.errors))),
+            ]
+        )
+
+        for entry, error in report.errors:
+            print(colored(f"{entry}: {error}", "red"))
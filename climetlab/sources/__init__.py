@@ -7,13 +7,15 @@
 # nor does it submit to any jurisdiction.
 #
 
+import asyncio
+import functools
 import os
 import re
 import weakref
 from importlib import import_module
 
 from climetlab.core import Base
-from climetlab.core.caching import cache_file
+from climetlab.core.caching import cache_file, cache_path
 from climetlab.core.plugins import find_plugin
 from climetlab.core.settings import SETTINGS
 from climetlab.utils.html import table
@@ -47,16 +49,27 @@ class Source(Base):
         # Used by multi-source
         return False
 
-    def cache_file(self, create, args, **kwargs):
+    def _cache_owner(self):
         owner = self.name
         if self.dataset:
             owner = self.dataset.name
         if owner is None:
             owner = re.sub(r"(?!^)([A-Z]+)", r"-\1", self.__class__.__name__).lower()
+        return owner
+
+    def cached(self, args, hash_extra=None, extension=".cache"):
+        """Returns True if `cache_file` would find its file in the cache
+        for these arguments, without creating it."""
+        return os.path.exists(
+            cache_path(self._cache_owner(), args, hash_extra, extension)
+        )
+
+    def cache_file(self, create, args, **kwargs):
+        owner = self._cache_owner()
 
         resource = None
         for connection in self.connect_to_mirrors():
-            resource = connection.get_file(create, args)
+            resource = connection.get_file(create, args, **kwargs)
         if resource:
             return resource
 
@@ -171,6 +184,21 @@ def load_source_lazily(name, *args, **kwargs):
     return LazySource(name, *args, **kwargs)
 
 
+async def load_source_async(name: str, *args, **kwargs) -> Source:
+    """Coroutine version of :py:func:`load_source`. Url downloads run on the
+    event loop (if `aiohttp` is installed), the other sources are loaded
+    in a thread. Use `asyncio.gather()` to load several sources concurrently."""
+    from climetlab.core.asynchronous import ENGINE
+
+    await ENGINE.prefetch(name, *args, **kwargs)
+
+    # The data is now in the cache, or the source downloads it itself
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, functools.partial(load_source, name, *args, **kwargs)
+    )
+
+
 def list_entries():
     here = os.path.realpath(os.path.dirname(__file__))
     result = []
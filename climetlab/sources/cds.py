@@ -10,6 +10,7 @@
 import cdsapi
 import yaml
 
+from climetlab.core.planning import RequestPlanner, requests_and_options
 from climetlab.core.thread import SoftThreadPool
 from climetlab.decorators import normalize
 from climetlab.utils import tqdm
@@ -74,13 +75,14 @@ class CDSRetriever(FileSource):
         super().__init__()
 
         assert isinstance(dataset, str)
-        if len(args):
-            assert len(args) == 1
-            assert isinstance(args[0], dict)
-            assert not kwargs
-            kwargs = args[0]
 
-        requests = self.requests(**kwargs)
+        requests, options = requests_and_options(args, kwargs)
+
+        planner = RequestPlanner(
+            cached=lambda r: self.cached((dataset, r), extension=self._extension(r)),
+            **options,
+        )
+        requests = planner.plan([self.request(**r) for r in requests])
 
         client()  # Trigger password prompt before thraeding
 
@@ -103,24 +105,16 @@ class CDSRetriever(FileSource):
         return self.cache_file(
             retrieve,
             (dataset, request),
-            extension=EXTENSIONS.get(request.get("format"), ".cache"),
+            extension=self._extension(request),
         )
 
+    def _extension(self, request):
+        return EXTENSIONS.get(request.get("format"), ".cache")
+
     @normalize("date", "date-list(%Y-%m-%d)")
     @normalize("area", "bounding-box(list)")
-    def requests(self, **kwargs):
-        split_on = kwargs.pop("split_on", None)
-        if split_on is None or not isinstance(kwargs.get(split_on), (list, tuple)):
-            return [kwargs]
-
-        result = []
-
-        for v in kwargs[split_on]:
-            r = dict(**kwargs)
-            r[split_on] = v
-            result.append(r)
-
-        return result
+    def request(self, **kwargs):
+        return kwargs
 
     def to_pandas(self, **kwargs):
         pandas_read_csv_kwargs = dict(
@@ -0,0 +1,33 @@
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import logging
+import os
+
+from .file import FileSource
+
+LOG = logging.getLogger(__name__)
+
+
+class Directory(FileSource):
+    """Files of a directory tree. The size, modification time and format of
+    the files are kept in a manifest in the cache, so that when the directory
+    is opened again, only the new or modified files are inspected."""
+
+    def __init__(self, path, filter=None, merger=None, expand_user=True):
+        if expand_user:
+            path = os.path.expanduser(path)
+
+        if not os.path.isdir(path):
+            raise NotADirectoryError(path)
+
+        super().__init__(path, filter, merger)
+
+
+source = Directory
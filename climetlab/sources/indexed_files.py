@@ -0,0 +1,67 @@
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import logging
+import os
+
+from filelock import FileLock
+
+from climetlab.core.caching import (
+    check_cache_size,
+    file_in_cache_directory,
+    update_entry,
+)
+from climetlab.core.statistics import record_statistics
+from climetlab.indexing.database import SqlDatabase, SqlDatabaseWriter
+from climetlab.indexing.grib import list_files, update_database
+from climetlab.readers.grib.fieldset import FieldSet
+
+LOG = logging.getLogger(__name__)
+
+
+class IndexedFiles(FieldSet):
+    """GRIB fields of a directory tree, selected with a persistent index.
+    The index is updated incrementally: only new or modified files are scanned,
+    and only the files containing the requested fields are opened."""
+
+    def __init__(self, path, request=None, index=None, workers=1):
+        super().__init__()
+
+        path = os.path.abspath(os.path.expanduser(path))
+        tasks = [(p, None) for p in list_files(path)]
+
+        if index is None:
+            index = self.cache_file(
+                lambda target, args: SqlDatabaseWriter(target).close(),
+                dict(path=path),
+                extension=".db",
+            )
+
+        request = {} if request is None else request
+        record_statistics("indexed-files", request=str(request))
+
+        # Other processes may be updating the same index
+        with FileLock(index + ".update.lock"):
+            update_database(index, tasks, workers, remove_missing=True)
+            if file_in_cache_directory(index):
+                # The size of the index has changed
+                update_entry(index)
+                check_cache_size()
+
+            entries = SqlDatabase(index).lookup(request, metadata=True)
+
+        for path, part, metadata in entries:
+            self.fields.append((path,) + tuple(part))
+            self.metadata.append({k: v for k, v in metadata.items() if v is not None})
+
+    def __repr__(self):
+        return f"IndexedFiles({len(self)} fields)"
+
+
+source = IndexedFiles
@@ -25,23 +25,26 @@ class IndexedUrls(MultiSource):
         **kwargs,
     ):
 
-        urls_parts = index.lookup_request(request)
+        urls_parts = index.lookup_request(request, metadata=True)
         record_statistics(
             "indexed-urls",
             request=str(request),
         )
 
         sources = []
-        for url, parts in urls_parts:
+        for url, parts, metadata in urls_parts:
             source = load_source(
                 "url",
                 url=url,
                 parts=parts,
+                parts_metadata=metadata,
                 filter=filter,
                 merger=merger,
                 force=force,
                 # Load lazily so we can do parallel downloads
-                # lazily=True,
+                lazily=True,
+                # Share the connections fairly with the other sources
+                owner=self,
                 **kwargs,
             )
             sources.append(source)
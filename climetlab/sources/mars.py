@@ -9,6 +9,7 @@
 
 import ecmwfapi
 
+from climetlab.core.planning import RequestPlanner, requests_and_options
 from climetlab.core.thread import SoftThreadPool
 from climetlab.decorators import normalize
 from climetlab.utils import tqdm
@@ -59,10 +60,13 @@ def service(name):
 
 
 class MARSRetriever(FileSource):
-    def __init__(self, **kwargs):
+    def __init__(self, *args, **kwargs):
         super().__init__()
 
-        requests = self.requests(**kwargs)
+        requests, options = requests_and_options(args, kwargs)
+
+        planner = RequestPlanner(cached=self.cached, **options)
+        requests = planner.plan([self.request(**r) for r in requests])
 
         service("mars")  # Trigger password prompt before thraeding
 
@@ -90,19 +94,8 @@ class MARSRetriever(FileSource):
     @normalize("param", "variable-list(mars)")
     @normalize("date", "date-list(%Y-%m-%d)")
     @normalize("area", "bounding-box(list)")
-    def requests(self, **kwargs):
-        split_on = kwargs.pop("split_on", None)
-        if split_on is None or not isinstance(kwargs.get(split_on), (list, tuple)):
-            return [kwargs]
-
-        result = []
-
-        for v in kwargs[split_on]:
-            r = dict(**kwargs)
-            r[split_on] = v
-            result.append(r)
-
-        return result
+    def request(self, **kwargs):
+        return kwargs
 
     def to_pandas(self, **kwargs):
 
@@ -7,6 +7,7 @@
 # nor does it submit to any jurisdiction.
 #
 
+import bisect
 import itertools
 import logging
 
@@ -22,7 +23,9 @@ LOG = logging.getLogger(__name__)
 
 
 class MultiSource(Source):
-    def __init__(self, *sources, filter=None, merger=None):
+    def __init__(self, *sources, filter=None, merger=None, read_ahead=0):
+        """`read_ahead` is the number of sources that are prepared in background
+        threads (e.g. scanning files), while the current one is iterated."""
 
         if len(sources) == 1 and isinstance(sources[0], list):
             sources = sources[0]
@@ -32,7 +35,10 @@ class MultiSource(Source):
         self.sources = [s.mutate() for s in sources if not s.ignore()]
         self.filter = filter
         self.merger = merger
+        self.read_ahead = read_ahead
         self._lengths = [None] * len(self.sources)
+        # self._ends[i] is the index of the first item after self.sources[i]
+        self._ends = []
 
     def ignore(self):
         return len(self.sources) == 0
@@ -57,30 +63,75 @@ class MultiSource(Source):
             s._set_dataset(dataset)
 
     def __iter__(self):
+        if self.read_ahead > 0 and len(self.sources) > 1:
+            return self._iter_with_read_ahead()
         return itertools.chain(*self.sources)
 
+    def _prepare(self, i):
+        # Getting the length of a source forces its reader to be created
+        try:
+            self._length(i)
+        except Exception:
+            LOG.debug("Cannot prepare %s", self.sources[i], exc_info=True)
+
+    def _iter_with_read_ahead(self):
+        with SoftThreadPool(nthreads=self.read_ahead) as pool:
+            futures = {}
+            for i, source in enumerate(self.sources):
+                last = min(i + self.read_ahead, len(self.sources) - 1)
+                for j in range(i + 1, last + 1):
+                    if j not in futures:
+                        futures[j] = pool.submit(self._prepare, j)
+
+                # Make sure the source is not still being prepared
+                if i in futures:
+                    futures.pop(i).result()
+
+                yield from source
+
     def __getitem__(self, n):
 
         if n < 0:
             n = len(self) + n
 
-        i = 0
-        while n >= self._length(i):
-            n -= self._length(i)
-            i += 1
-        return self.sources[i][n]
+        # Only the lengths of the sources up to item n are needed
+        ends = self._ends
+        while len(ends) < len(self.sources) and (not ends or ends[-1] <= n):
+            ends.append((ends[-1] if ends else 0) + self._length(len(ends)))
+
+        i = bisect.bisect_right(ends, n)
+        if n < 0 or i >= len(self.sources):
+            raise IndexError(n)
+
+        return self.sources[i][n - (ends[i - 1] if i else 0)]
 
     def sel(self, *args, **kwargs):
         raise NotImplementedError
 
     def __len__(self):
-        return sum(self._length(i) for i, _ in enumerate(self.sources))
+        self._compute_lengths()
+        return sum(self._lengths)
 
     def _length(self, i):
         if self._lengths[i] is None:
             self._lengths[i] = len(self.sources[i])
         return self._lengths[i]
 
+    def _compute_lengths(self):
+        # Computing a length may require scanning a file, so this is done in parallel
+        missing = [i for i, n in enumerate(self._lengths) if n is None]
+
+        nthreads = min(self.settings("number-of-download-threads"), len(missing))
+        if nthreads < 2:
+            for i in missing:
+                self._length(i)
+            return
+
+        with SoftThreadPool(nthreads=nthreads) as pool:
+            futures = [(i, pool.submit(len, self.sources[i])) for i in missing]
+            for i, f in futures:
+                self._lengths[i] = f.result()
+
     def __repr__(self) -> str:
         string = ",".join(repr(s) for s in self.sources)
         return f"{self.__class__.__name__}({string})"
@@ -115,21 +166,21 @@ class MultiSource(Source):
                 has_callables = True
                 callables.append(s)
             else:
-                callables.append(lambda *args, **kwargs: s)
+                callables.append(lambda *args, s=s, **kwargs: s)
 
         if not has_callables:
             return sources
 
         nthreads = min(self.settings("number-of-download-threads"), len(callables))
         if nthreads < 2:
-            return [s() for s in sources]
+            return [s() for s in callables]
 
         def _call(s, *args, **kwargs):
             return s(*args, **kwargs)
 
         with SoftThreadPool(nthreads=nthreads) as pool:
 
-            futures = [pool.submit(_call, s, observer=pool) for s in sources]
+            futures = [pool.submit(_call, s, observer=pool) for s in callables]
 
             iterator = (f.result() for f in futures)
             sources = list(tqdm(iterator, leave=False, total=len(futures)))
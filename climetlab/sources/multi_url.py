@@ -31,6 +31,8 @@ class MultiUrl(MultiSource):
                 force=force,
                 # Load lazily so we can do parallel downloads
                 lazily=True,
+                # Share the connections fairly with the other sources
+                owner=self,
             )
             for url in sorted(urls)
         ]
@@ -9,11 +9,23 @@
 
 
 import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+from urllib.parse import urlparse
 
 from multiurl import Downloader
 
+from climetlab.core.caching import update_entry
+from climetlab.core.scheduler import DOWNLOAD_SCHEDULER
+from climetlab.core.segmented import SegmentedDownload
+from climetlab.core.sessions import SESSIONS
 from climetlab.core.settings import SETTINGS
 from climetlab.core.statistics import record_statistics
+from climetlab.indexing.range_planner import RANGE_PLANNER
 from climetlab.utils import tqdm
 
 from .file import FileSource
@@ -21,24 +33,163 @@ from .file import FileSource
 LOG = logging.getLogger(__name__)
 
 
+class ThrottledProgressBar:
+    """The downloaders report each chunk to their progress bar,
+    which is where the bandwidth budget is enforced."""
+
+    def __init__(self, pbar):
+        self.pbar = pbar
+
+    def update(self, n):
+        DOWNLOAD_SCHEDULER.throttle(n)
+        self.pbar.update(n)
+
+    def __enter__(self):
+        self.pbar.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self.pbar.__exit__(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.pbar, name)
+
+
 def progress_bar(total, initial=0, desc=None):
-    return tqdm(
-        total=total,
-        initial=initial,
-        unit_scale=True,
-        unit_divisor=1024,
-        unit="B",
-        disable=False,
-        leave=False,
-        desc=desc,
+    return ThrottledProgressBar(
+        tqdm(
+            total=total,
+            initial=initial,
+            unit_scale=True,
+            unit_divisor=1024,
+            unit="B",
+            disable=False,
+            leave=False,
+            desc=desc,
+        )
     )
 
 
+class StreamingProgressBar:
+    """Lets `feeder` look at the downloaded file after each chunk."""
+
+    def __init__(self, pbar, feeder):
+        self.pbar = pbar
+        self.feeder = feeder
+
+    def update(self, n):
+        self.pbar.update(n)
+        self.feeder.poll()
+
+    def __enter__(self):
+        self.pbar.__enter__()
+        return self
+
+    def __exit__(self, *args):
+        return self.pbar.__exit__(*args)
+
+    def __getattr__(self, name):
+        return getattr(self.pbar, name)
+
+
+class GribStreamFeeder:
+    """Gives the GRIB messages of a file being downloaded to a queue, as soon as
+    they are written. The messages are read from a file opened before the
+    download completes, so that they can be read while the file is moved."""
+
+    def __init__(self, path, messages):
+        from climetlab.readers.grib.codes import GribStreamParser
+
+        self.path = path
+        self.messages = messages
+        self.parser = GribStreamParser()
+        self.file = None
+        self.reader = None
+
+    def _open(self, path):
+        from climetlab.readers.grib.codes import CodesReader
+
+        self.file = open(path, "rb")
+        self.reader = CodesReader(path)
+
+    def poll(self):
+        if self.file is None:
+            if not os.path.exists(self.path):
+                return
+            self._open(self.path)
+
+        data = self.file.read()
+        if data:
+            for offset, length in self.parser.feed(data):
+                self.messages.put((self.reader, offset, length))
+
+    def finish(self, path):
+        # The download is complete and was moved to `path`
+        if self.file is None:
+            self._open(path)
+        try:
+            self.poll()
+        finally:
+            self.file.close()
+
+    def close(self, path):
+        if self.reader is not None:
+            self.reader.reopen(path)
+
+
+# Key of the cache data recording when the remote file was last known unchanged
+CHECKED = "climetlab-checked"
+
+
+def url_cache_data(headers):
+    cache_data = dict(headers) if headers else {}
+    cache_data[CHECKED] = time.time()
+    return cache_data
+
+
+def is_fresh(cache_data, now=None):
+    """Returns True if the cached copy of an url is recent enough to be used
+    without asking the server, based on the 'Cache-Control: max-age' of the
+    response or on the 'url-freshness-period' setting."""
+    if not cache_data or CHECKED not in cache_data:
+        return False
+
+    period = SETTINGS.get("url-freshness-period")
+
+    cache_control = cache_data.get("cache-control", "").lower()
+    if "no-cache" in cache_control or "no-store" in cache_control:
+        return False
+
+    m = re.search(r"max-age=(\d+)", cache_control)
+    if m:
+        period = int(m.group(1))
+
+    if not period:
+        return False
+
+    if now is None:
+        now = time.time()
+    return now < cache_data[CHECKED] + period
+
+
+def gather_range_statistics(name, **values):
+    # Only the downloads planned by the range planner teach it
+    record_statistics(name, **values)
+    RANGE_PLANNER.observe(name, **values)
+
+
 class Url(FileSource):
+
+    _downloader = None
+    _messages = None
+    _streaming = None
+    _streaming_error = None
+
     def __init__(
         self,
         url,
         parts=None,
+        parts_metadata=None,
         filter=None,
         merger=None,
         verify=True,
@@ -48,6 +199,10 @@ class Url(FileSource):
         http_headers=None,
         update_if_out_of_date=False,
         fake_headers=None,  # When HEAD is not allowed but you know the size
+        priority=0,
+        segments=None,
+        stream=False,
+        owner=None,
     ):
 
         super().__init__(filter=filter, merger=merger)
@@ -57,12 +212,22 @@ class Url(FileSource):
 
         self.url = url
         self.parts = parts
+        self.verify = verify
+        self.http_headers = http_headers
+        self.chunk_size = chunk_size
+        # Identifies the downloads of this source (or of its parent source)
+        # so that the scheduler shares the connections fairly between sources
+        self.owner = self if owner is None else owner
         LOG.debug("URL %s", url)
 
         self.update_if_out_of_date = update_if_out_of_date
 
-        self.downloader = Downloader(
-            url,
+        statistics_gatherer = record_statistics
+        if range_method == "adaptive":
+            range_method = RANGE_PLANNER.range_method(url, parts)
+            statistics_gatherer = gather_range_statistics
+
+        self._downloader_options = dict(
             chunk_size=chunk_size,
             timeout=SETTINGS.get("url-download-timeout"),
             verify=verify,
@@ -70,29 +235,55 @@ class Url(FileSource):
             range_method=range_method,
             http_headers=http_headers,
             fake_headers=fake_headers,
-            statistics_gatherer=record_statistics,
+            session=SESSIONS.session(url),
+            statistics_gatherer=statistics_gatherer,
             progress_bar=progress_bar,
             resume_transfers=True,
             override_target_file=False,
             download_file_extension=".download",
         )
 
+        if parts and urlparse(url).scheme in ("http", "https"):
+            # The downloader of the parts checks that the server accepts byte
+            # ranges, which is not needed if the parts are found in a mirror
+            downloader = Downloader(url, **dict(self._downloader_options, parts=None))
+        else:
+            downloader = self.downloader
+
         if extension and extension[0] != ".":
             extension = "." + extension
 
         if extension is None:
-            extension = self.downloader.extension()
+            extension = downloader.extension()
 
-        self.path = self.downloader.local_path()
+        self.path = downloader.local_path()
         if self.path is not None:
             return
 
         if force is None:
             force = self.out_of_date
 
+        # Files that are open cannot be moved on Windows
+        streamable = not parts and hasattr(self.downloader, "headers")
+        if stream and streamable and sys.platform != "win32":
+            self._start_streaming(extension, force, priority)
+            return
+
         def download(target, _):
-            self.downloader.download(target)
-            return self.downloader.cache_data()
+            n = self._number_of_segments(segments)
+            if n > 1:
+                self._segmented_download(target, n, priority)
+                return url_cache_data(self.downloader.cache_data())
+
+            # Downloads from the same source share their connections fairly
+            # with the other sources, see DownloadScheduler
+            with DOWNLOAD_SCHEDULER.connection(
+                url,
+                owner=self.owner,
+                priority=priority,
+            ):
+                self.downloader.download(target)
+            return url_cache_data(self.downloader.cache_data())
 
         self.path = self.cache_file(
             download,
@@ -101,6 +292,157 @@ class Url(FileSource):
             force=force,
         )
 
+        if parts:
+            self._index_parts(parts, parts_metadata)
+
+    @property
+    def downloader(self):
+        if self._downloader is None:
+            self._downloader = Downloader(self.url, **self._downloader_options)
+        return self._downloader
+
+    def _number_of_segments(self, segments):
+        # Large files are downloaded with several connections, if the server supports it
+        if self.parts or segments == 1 or not hasattr(self.downloader, "headers"):
+            return 1
+
+        headers = self.downloader.headers()
+        if headers.get("accept-ranges") != "bytes" or "content-encoding" in headers:
+            return 1
+
+        try:
+            size = int(headers["content-length"])
+        except (KeyError, ValueError):
+            return 1
+
+        if segments is None:
+            threshold = SETTINGS.get("segmented-download-threshold")
+            if threshold is None or size < threshold:
+                return 1
+            segments = SETTINGS.get("maximum-connections-per-host")
+
+        return min(segments, max(1, size // (1024 * 1024)))
+
+    def _segmented_download(self, target, segments, priority):
+        headers = self.downloader.headers()
+        SegmentedDownload(
+            self.url,
+            size=int(headers["content-length"]),
+            segments=segments,
+            etag=headers.get("etag"),
+            verify=self.verify,
+            timeout=SETTINGS.get("url-download-timeout"),
+            http_headers=self.http_headers,
+            chunk_size=self.chunk_size,
+            owner=self.owner,
+            priority=priority,
+            progress_bar=progress_bar,
+            statistics_gatherer=record_statistics,
+            title=self.downloader.title(),
+        ).download(target)
+
+    def _start_streaming(self, extension, force, priority):
+        # The file is downloaded in the background, and its GRIB messages
+        # are given to __iter__ as soon as they are complete
+        self._messages = queue.Queue()
+        self._streaming = threading.Thread(
+            target=self._stream,
+            args=(self._messages, extension, force, priority),
+            daemon=True,
+        )
+        self._streaming.start()
+
+    def _stream(self, messages, extension, force, priority):
+        feeder = None
+
+        def download(target, _):
+            nonlocal feeder
+            # The downloader writes to a temporary file, then renames it
+            feeder = GribStreamFeeder(target + ".download", messages)
+
+            def streaming_progress_bar(*args, **kwargs):
+                return StreamingProgressBar(progress_bar(*args, **kwargs), feeder)
+
+            previous = self.downloader.progress_bar
+            self.downloader.progress_bar = streaming_progress_bar
+            try:
+                with DOWNLOAD_SCHEDULER.connection(
+                    self.url,
+                    owner=self.owner,
+                    priority=priority,
+                ):
+                    self.downloader.download(target)
+            finally:
+                self.downloader.progress_bar = previous
+            feeder.finish(target)
+            return url_cache_data(self.downloader.cache_data())
+
+        try:
+            self.path = self.cache_file(
+                download,
+                dict(url=self.url, parts=None),
+                extension=extension,
+                force=force,
+            )
+            if feeder is not None:
+                # The fields already given now read the file from the cache
+                feeder.close(self.path)
+            messages.put(None)
+        except Exception as e:
+            self._streaming_error = e
+            messages.put(e)
+
+    def _iter_messages(self, messages):
+        from climetlab.readers.grib.codes import GribField
+
+        count = 0
+        while True:
+            message = messages.get()
+            if message is None:
+                break
+            if isinstance(message, Exception):
+                raise message
+
+            reader, offset, length = message
+            count += 1
+            yield GribField(reader, offset, length)
+
+        if count == 0:
+            # The file was already in the cache, or is not a GRIB file
+            yield from self._reader
+
+    @property
+    def _reader(self):
+        if self._streaming is not None:
+            self._streaming.join()
+            if self._streaming_error is not None:
+                raise self._streaming_error
+        return FileSource._reader.fget(self)
+
+    def mutate(self):
+        if self._messages is not None:
+            # Not yet iterated, the stream must not be consumed
+            return self
+        return super().mutate()
+
+    def __iter__(self):
+        if self._messages is None:
+            return super().__iter__()
+        # Only the first iteration follows the download
+        messages, self._messages = self._messages, None
+        return self._iter_messages(messages)
+
+    def _index_parts(self, parts, parts_metadata):
+        # The downloaded file is the concatenation of the parts. If they are
+        # single GRIB messages, the file does not need to be scanned
+        with open(self.path, "rb") as f:
+            if f.read(4) != b"GRIB":
+                return
+
+        from climetlab.readers.grib.codes import GribIndex
+
+        GribIndex(self.path, parts=parts, metadata=parts_metadata)
+
     def connect_to_mirror(self, mirror):
         return mirror.connection_for_url(self, self.url, self.parts)
 
@@ -108,6 +450,10 @@ class Url(FileSource):
         if SETTINGS.get("check-out-of-date-urls") is False:
             return False
 
+        if is_fresh(cache_data):
+            LOG.debug("URL %s checked recently, not checking again", self.url)
+            return False
+
         if self.downloader.out_of_date(path, cache_data):
             if SETTINGS.get("download-out-of-date-urls") or self.update_if_out_of_date:
                 LOG.warning(
@@ -120,6 +466,11 @@ class Url(FileSource):
                     "To enable automatic downloading of updated URLs set the 'download-out-of-date-urls'"
                     " setting to True",
                 )
+            return False
+
+        if cache_data is not None:
+            # Unchanged, the next checks can be skipped for a while
+            update_entry(path, url_cache_data(cache_data))
         return False
 
     def __repr__(self) -> str:
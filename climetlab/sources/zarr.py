@@ -15,38 +15,22 @@ import s3fs
 import xarray as xr
 import zarr
 
+from climetlab.core.chunks import ChunkCache
+
 from . import Source
 
 LOG = logging.getLogger(__name__)
 
 
-class Cache:
-    def __init__(self, store):
-        self._store = store
-
-    def __contains__(self, key):
-        LOG.debug("S3 Cache.__contains__ %s", key)
-        return key in self._store
-
-    def __getitem__(self, key):
-        LOG.debug("S3 Cache.__getitem__ %s", key)
-        data = self._store[key]
-        LOG.debug("S3 Cache.__getitem__ %d", len(data))
-        return data
-
-    def keys(self):
-        return self._store.keys()
-
-
 def url_to_s3_store(url, user=None, password=None):
     bits = url.split("/")
     if bits[0] == "s3:":
         bits[0] = "https:"
 
-    url = "/".join(bits[:3])
+    endpoint = "/".join(bits[:3])
     root = "/".join(bits[3:])
 
-    fs = s3fs.S3FileSystem(anon=True, client_kwargs={"endpoint_url": url})
+    fs = s3fs.S3FileSystem(anon=True, client_kwargs={"endpoint_url": endpoint})
 
     store = s3fs.S3Map(
         root=root,
@@ -54,7 +38,7 @@ def url_to_s3_store(url, user=None, password=None):
         check=False,
     )
 
-    store = Cache(store)
+    store = ChunkCache(store, url=url)
 
     store = zarr.storage.KVStore(store)
 
@@ -9,78 +9,32 @@
 
 import logging
 
-import s3fs
 import xarray as xr
 import zarr
 
+from climetlab.mergers.xarray import virtual_concat
+
 from . import Source
+from .zarr import url_to_s3_store
 
 LOG = logging.getLogger(__name__)
 
 
-class Cache:
-    def __init__(self, store):
-        self._store = store
-
-    def __contains__(self, key):
-        # print("Cache.__contains__", key)
-        return key in self._store
-
-    def __getitem__(self, key):
-        # print("Cache.__getitem__", key)
-        data = self._store[key]
-        # print(len(data))
-        return data
-
-    def keys(self):
-        return self._store.keys()
-
-
 class ZarrS3(Source):
-    def __init__(self, urls, **kwargs):
+    def __init__(self, urls, concat_dim="forecast_time", **kwargs):
         super().__init__(**kwargs)
 
         if not isinstance(urls, list):
             urls = [urls]
 
-        def url_to_store(url):
-            bits = url.split("/")
-
-            url = "/".join(bits[:3])
-            root = "/".join(bits[3:])
-
-            fs = s3fs.S3FileSystem(anon=True, client_kwargs={"endpoint_url": url})
-
-            store = s3fs.S3Map(
-                root=root,
-                s3=fs,
-                check=False,
-            )
-
-            store = Cache(store)
-
-            store = zarr.storage.KVStore(store)
-
-            return store
-
-        # adding a new dimension take a lot of memory
-        # dslist = [xr.open_dataset(url_to_store(url), engine="zarr") for url in urls]
-        # self._ds = xr.concat(dslist, dim = 'head_time')
-        # return self._ds
-
-        # options = self.read_zarr_options()
-
-        # concat_dim = options.get("concat_dim", "forecast_time")
-        concat_dim = "forecast_time"  # TODO: fix me
-
-        stores = [url_to_store(url) for url in urls]
+        stores = [url_to_s3_store(url) for url in urls]
 
         dslist = []
         for store, url in zip(stores, urls):
             try:
                 dslist.append(xr.open_dataset(store, engine="zarr", chunks="auto"))
             except zarr.errors.GroupNotFoundError as e:
-                print(f"ERROR : Cannot find data at url = {url}")
+                LOG.error("ERROR : Cannot find data from %s", url)
                 raise (e)
 
         assert len(dslist) > 0
@@ -88,15 +42,7 @@ class ZarrS3(Source):
         if len(dslist) == 1:
             self._ds = dslist[0]
         else:
-            dsdict = {}
-            for ds in dslist:
-                for value in ds[concat_dim].values:
-                    dsdict[value] = ds.sel(**{concat_dim: value})
-                values_sorted = sorted(dsdict.keys())
-                dslist = [dsdict[d] for d in values_sorted]
-
-            self._ds = xr.concat(dslist, dim=concat_dim)
-            # self._ds = xr.open_mfdataset(stores, engine="zarr", combine='nested')
+            self._ds = virtual_concat(dslist, concat_dim)
 
     def to_xarray(self):
         # self._ds = self.post_xarray_open_dataset_hook(self._ds)
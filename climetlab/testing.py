@@ -10,7 +10,11 @@
 import logging
 import os
 import pathlib
+import re
+import threading
 from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from importlib import import_module
 from unittest.mock import patch
 
@@ -54,6 +58,73 @@ def data_file_url(*args):
     return file_url(data_file(*args))
 
 
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serves a directory, with support for single byte ranges."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format, *args):
+        LOG.debug(format, *args)
+
+    def send_head(self):
+        self.server.requests.append(
+            (self.command, self.path, self.headers.get("range"))
+        )
+
+        m = re.match(r"^bytes=(\d+)-(\d*)$", self.headers.get("range", ""))
+        path = self.translate_path(self.path)
+        if m is None or not os.path.isfile(path):
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else size - 1
+        end = min(end, size - 1)
+
+        f = open(path, "rb")
+        f.seek(start)
+        self.range_length = end - start + 1
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(self.range_length))
+        self.end_headers()
+        return f
+
+    def end_headers(self):
+        self.send_header("Accept-Ranges", "bytes")
+        super().end_headers()
+
+    def copyfile(self, source, outputfile):
+        if hasattr(self, "range_length"):
+            outputfile.write(source.read(self.range_length))
+        else:
+            super().copyfile(source, outputfile)
+
+
+@contextmanager
+def http_server(directory):
+    """Serves `directory` on a local port. Yields the server, with its base url
+    in `url`, the list of the requests received in `requests` and the number
+    of connections opened in `connections`."""
+    handler = partial(RangeRequestHandler, directory=directory)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.url = "http://127.0.0.1:%d" % (server.server_address[1],)
+    server.requests = []
+    server.connections = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
 def modules_installed(*modules):
     for module in modules:
         try:
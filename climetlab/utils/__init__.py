@@ -51,7 +51,9 @@ def get_json(url: str, cache=False):
         with open(download_and_cache(url)) as f:
             return json.loads(f.read())
 
-    r = requests.get(url)
+    from climetlab.core.sessions import SESSIONS
+
+    r = SESSIONS.get(url)
     r.raise_for_status()
     return r.json()
 
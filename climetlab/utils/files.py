@@ -0,0 +1,132 @@
+# (C) Copyright 2021 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import logging
+import os
+import threading
+
+LOG = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1024 * 1024
+
+# From linux/fs.h, clones the blocks of a file (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+O_BINARY = getattr(os, "O_BINARY", 0)
+
+
+def _copy_file_range(fin, fout, offset, length):
+    while length > 0:
+        n = os.copy_file_range(fin, fout, length, offset)
+        if n == 0:
+            raise EOFError(f"Unexpected end of file at offset {offset}")
+        offset += n
+        length -= n
+
+
+def _sendfile(fin, fout, offset, length):
+    while length > 0:
+        n = os.sendfile(fout, fin, offset, length)
+        if n == 0:
+            raise EOFError(f"Unexpected end of file at offset {offset}")
+        offset += n
+        length -= n
+
+
+def _read_write(fin, fout, offset, length):
+    os.lseek(fin, offset, os.SEEK_SET)
+    while length > 0:
+        data = os.read(fin, min(length, BUFFER_SIZE))
+        if not data:
+            raise EOFError(f"Unexpected end of file at offset {offset}")
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fout, view) :]
+        offset += len(data)
+        length -= len(data)
+
+
+def copy_range(fin, fout, offset, length):
+    """Appends `length` bytes of the file descriptor `fin`, starting at `offset`,
+    to the file descriptor `fout`. The copy is done by the kernel when possible,
+    with ``copy_file_range`` (which may share the blocks of the files on some
+    filesystems) or ``sendfile``, so the data does not go through Python."""
+
+    for method in (_copy_file_range, _sendfile):
+        if not hasattr(os, method.__name__[1:]):
+            continue
+        start = os.lseek(fout, 0, os.SEEK_CUR)
+        try:
+            return method(fin, fout, offset, length)
+        except OSError as e:
+            # Not supported between these files, e.g. across filesystems
+            # with old kernels
+            LOG.debug("%s failed: %s", method.__name__[1:], e)
+            os.lseek(fout, start, os.SEEK_SET)
+            os.ftruncate(fout, start)
+
+    _read_write(fin, fout, offset, length)
+
+
+def extract_parts(path, parts, target):
+    """Writes the concatenation of the byte ranges `parts`, a list of
+    (offset, length), of the file `path` into `target`."""
+    fin = os.open(path, os.O_RDONLY | O_BINARY)
+    try:
+        fout = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | O_BINARY, 0o666)
+        try:
+            for offset, length in parts:
+                copy_range(fin, fout, offset, length)
+        finally:
+            os.close(fout)
+    finally:
+        os.close(fin)
+
+
+def _link(source, target):
+    os.link(source, target)
+
+
+def _reflink(source, target):
+    import fcntl
+
+    with open(source, "rb") as fin, open(target, "wb") as fout:
+        fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+
+
+def _copy(source, target):
+    extract_parts(source, [(0, os.path.getsize(source))], target)
+
+
+def materialise(source, target, link=True):
+    """Creates `target` with the content of the file `source`, without copying
+    the data when possible. The file is hard linked if `link` is True (the two
+    paths are then the same file, so it must not be modified), or cloned with
+    ``FICLONE`` on filesystems that support it. Otherwise, the file is copied
+    by the kernel (see :func:`copy_range`)."""
+
+    methods = [_link, _reflink, _copy] if link else [_reflink, _copy]
+    tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        for method in methods[:-1]:
+            try:
+                method(source, tmp)
+                break
+            except (OSError, ImportError) as e:
+                # Different filesystems, not supported...
+                LOG.debug("%s %s: %s", method.__name__[1:], source, e)
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+        else:
+            methods[-1](source, tmp)
+
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
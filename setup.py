@@ -58,7 +58,7 @@ install_requires += [
     "cfgrib>=0.9.10",
     "cdsapi",
     "ecmwf-api-client>=1.6.1",
-    "multiurl>=0.0.8",
+    "multiurl>=0.2.1",
     "ecmwf-opendata",
     "tqdm",
     "eccodes>=1.3.0",
@@ -87,6 +87,9 @@ extras_require = {
         "zarr",
         "s3fs",
     ],
+    "async": [
+        "aiohttp",
+    ],
 }
 
 
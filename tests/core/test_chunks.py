@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import json
+import os
+
+import pytest
+
+from climetlab.testing import MISSING
+
+
+@pytest.fixture
+def s3_server(monkeypatch):
+    from moto.server import ThreadedMotoServer
+
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+
+    server = ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.stop()
+
+
+def make_store(endpoint, root):
+    import boto3
+
+    s3 = boto3.client("s3", endpoint_url=endpoint, region_name="us-east-1")
+    bucket, prefix = root.split("/", 1)
+    s3.create_bucket(Bucket=bucket, ACL="public-read")
+
+    s3.put_object(
+        Bucket=bucket,
+        Key=f"{prefix}/t/.zarray",
+        Body=json.dumps(dict(shape=[10, 4], chunks=[2, 4])),
+        ACL="public-read",
+    )
+    for i in range(5):
+        s3.put_object(
+            Bucket=bucket,
+            Key=f"{prefix}/t/{i}.0",
+            Body=b"chunk-%d..." % i,
+            ACL="public-read",
+        )
+
+    return s3
+
+
+def chunk_cache(endpoint, root, **kwargs):
+    import s3fs
+
+    from climetlab.core.chunks import ChunkCache
+
+    fs = s3fs.S3FileSystem(anon=True, client_kwargs={"endpoint_url": endpoint})
+    store = s3fs.S3Map(root=root, s3=fs, check=False)
+    return ChunkCache(store, url=f"{endpoint}/{root}", **kwargs)
+
+
+@pytest.mark.skipif(MISSING("s3fs", "moto", "boto3"), reason="S3FS or moto missing")
+def test_chunk_cache_prefetch(s3_server):
+    s3 = make_store(s3_server, "test/prefetch.zarr")
+
+    cache = chunk_cache(s3_server, "test/prefetch.zarr", prefetch=2)
+    assert cache["t/0.0"] == b"chunk-0..."
+
+    # The .zarray, the chunk and the two next ones
+    assert len(os.listdir(cache.directory)) == 4
+
+    assert "t/4.0" in cache
+    assert "t/9.0" not in cache
+    with pytest.raises(KeyError):
+        cache["t/9.0"]
+
+    # Prefetched chunks are not downloaded again
+    s3.delete_object(Bucket="test", Key="prefetch.zarr/t/1.0")
+    assert cache["t/1.0"] == b"chunk-1..."
+
+
+@pytest.mark.skipif(MISSING("s3fs", "moto", "boto3"), reason="S3FS or moto missing")
+def test_chunk_cache_lru(s3_server):
+    make_store(s3_server, "test/lru.zarr")
+
+    cache = chunk_cache(s3_server, "test/lru.zarr", prefetch=0, maximum_size=25)
+
+    cache["t/0.0"]
+    cache["t/2.0"]
+    cache["t/0.0"]
+    cache["t/3.0"]
+
+    assert len(os.listdir(cache.directory)) == 2
+    assert cache._name("t/0.0", cache._etag("t/0.0")) in cache._entries
+    assert cache._name("t/2.0", cache._etag("t/2.0")) not in cache._entries
+
+
+@pytest.mark.skipif(MISSING("s3fs", "moto", "boto3"), reason="S3FS or moto missing")
+def test_chunk_cache_etag(s3_server):
+    s3 = make_store(s3_server, "test/etag.zarr")
+
+    cache = chunk_cache(s3_server, "test/etag.zarr", prefetch=0)
+    assert cache["t/0.0"] == b"chunk-0..."
+
+    s3.put_object(
+        Bucket="test",
+        Key="etag.zarr/t/0.0",
+        Body=b"updated...",
+        ACL="public-read",
+    )
+
+    cache = chunk_cache(s3_server, "test/etag.zarr", prefetch=0)
+    assert cache["t/0.0"] == b"updated..."
+
+
+if __name__ == "__main__":
+    from climetlab.testing import main
+
+    main(__file__)
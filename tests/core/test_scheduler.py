@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import asyncio
+import threading
+import time
+
+from climetlab import settings
+from climetlab.core.scheduler import DownloadScheduler
+from climetlab.core.thread import SoftThreadPool
+
+
+def test_scheduler_per_host_limit():
+    scheduler = DownloadScheduler()
+    lock = threading.Lock()
+    active = dict(a=0, b=0)
+    peak = dict(a=0, b=0)
+
+    def download(host):
+        with scheduler.connection(f"http://{host}.example.com/data"):
+            with lock:
+                active[host] += 1
+                peak[host] = max(peak[host], active[host])
+            time.sleep(0.05)
+            with lock:
+                active[host] -= 1
+
+    with settings.temporary("maximum-connections-per-host", 2):
+        # Two pools, as two unrelated sources would do
+        with SoftThreadPool(nthreads=4) as pool1, SoftThreadPool(nthreads=4) as pool2:
+            futures = []
+            for _ in range(8):
+                futures.append(pool1.submit(download, "a"))
+                futures.append(pool2.submit(download, "a"))
+                futures.append(pool2.submit(download, "b"))
+            for f in futures:
+                f.result()
+
+    assert peak == dict(a=2, b=2)
+
+
+def test_scheduler_fair_and_priority():
+    scheduler = DownloadScheduler()
+    url = "http://example.com/data"
+    order = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocker():
+        with scheduler.connection(url, owner="blocker"):
+            started.set()
+            release.wait()
+
+    def download(name, owner, priority=0):
+        with scheduler.connection(url, owner=owner, priority=priority):
+            order.append(name)
+
+    with settings.temporary("maximum-connections-per-host", 1):
+        threads = [threading.Thread(target=blocker)]
+        threads[0].start()
+        started.wait()
+
+        for name, owner, priority in [
+            ("big1", "big", 0),
+            ("big2", "big", 0),
+            ("big3", "big", 0),
+            ("small", "small", 0),
+            ("urgent", "other", 1),
+        ]:
+            threads.append(
+                threading.Thread(target=download, args=(name, owner, priority))
+            )
+            threads[-1].start()
+            # Make sure the requests are queued in that order
+            while len(scheduler._waiting["example.com"]) < len(threads) - 1:
+                time.sleep(0.01)
+
+        release.set()
+        for t in threads:
+            t.join()
+
+    # The most urgent first, then the sources take turns
+    assert order == ["urgent", "big1", "small", "big2", "big3"]
+
+
+def test_scheduler_threads_and_coroutines():
+    scheduler = DownloadScheduler()
+    url = "http://example.com/data"
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def enter():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+
+    def leave():
+        with lock:
+            active[0] -= 1
+
+    def download():
+        with scheduler.connection(url):
+            enter()
+            time.sleep(0.05)
+            leave()
+
+    async def download_async():
+        async with scheduler.async_connection(url):
+            enter()
+            await asyncio.sleep(0.05)
+            leave()
+
+    async def main():
+        await asyncio.gather(*[download_async() for _ in range(6)])
+
+    with settings.temporary("maximum-connections-per-host", 2):
+        threads = [threading.Thread(target=download) for _ in range(6)]
+        for t in threads:
+            t.start()
+        asyncio.run(main())
+        for t in threads:
+            t.join()
+
+    assert peak[0] == 2
+    assert not scheduler._waiting and not scheduler._active
+
+
+def test_scheduler_bandwidth():
+    scheduler = DownloadScheduler()
+    with settings.temporary("maximum-download-bandwidth", "100K"):
+        start = time.monotonic()
+        for _ in range(5):
+            scheduler.throttle(10 * 1024)
+        assert time.monotonic() - start >= 0.45
+
+    start = time.monotonic()
+    for _ in range(100):
+        scheduler.throttle(10 * 1024 * 1024)
+    assert time.monotonic() - start < 0.1
+
+
+if __name__ == "__main__":
+    from climetlab.testing import main
+
+    main(__file__)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import json
+import os
+from unittest.mock import patch
+
+from climetlab import settings
+from climetlab.core.temporary import temp_directory
+from climetlab.indexing import GlobalIndex
+from climetlab.indexing.database import SqlDatabase
+
+
+def write_segment(path, name):
+    with open(path, "w") as f:
+        for i, param in enumerate(["t", "u"]):
+            entry = dict(param=param, _path=name, _offset=i * 10, _length=10)
+            print(json.dumps(entry), file=f)
+
+
+def test_indexing_global_segments():
+    with temp_directory() as tmpdir:
+        manifest = os.path.join(tmpdir, "index.manifest")
+        write_segment(os.path.join(tmpdir, "day1.index"), "day1.grib")
+        with open(manifest, "w") as f:
+            print("day1.index", file=f)
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            index = GlobalIndex(manifest, baseurl="http://example.com")
+            assert index.lookup_request(dict(param="u")) == [
+                ("http://example.com/day1.grib", [(10, 10)])
+            ]
+
+            # Append a new segment to the archive
+            write_segment(os.path.join(tmpdir, "day2.index"), "day2.grib")
+            with open(manifest, "a") as f:
+                print("day2.index", file=f)
+
+            # Only the new segment is downloaded
+            convert = SqlDatabase.to_sql_target
+            converted = []
+
+            def to_sql_target(self, target, url):
+                converted.append(url)
+                return convert(self, target, url)
+
+            with patch.object(SqlDatabase, "to_sql_target", to_sql_target):
+                index.refresh()
+                assert index.lookup_request(dict(param="u")) == [
+                    ("http://example.com/day1.grib", [(10, 10)]),
+                    ("http://example.com/day2.grib", [(10, 10)]),
+                ]
+
+            assert converted == [os.path.join(tmpdir, "day2.index")]
+
+
+if __name__ == "__main__":
+    from climetlab.testing import main
+
+    main(__file__)
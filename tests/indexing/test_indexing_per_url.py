@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import json
+import os
+import shutil
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from climetlab import load_source, settings
+from climetlab.core.temporary import temp_directory
+from climetlab.indexing import PerUrlIndex
+from climetlab.sources.url import Url
+from climetlab.testing import climetlab_file
+
+
+def write_index(path, n, params=("t", "u", "v")):
+    with open(path, "w") as f:
+        for i, param in enumerate(params):
+            entry = dict(param=param, n=str(n), _offset=i * 10, _length=10)
+            print(json.dumps(entry), file=f)
+
+
+@pytest.mark.parametrize("threads", [1, 5])
+def test_indexing_per_url_parallel(threads):
+    with temp_directory() as tmpdir:
+        for n in range(8):
+            write_index(os.path.join(tmpdir, f"data{n}.grb.index"), n)
+
+        with settings.temporary():
+            settings.set("cache-directory", os.path.join(tmpdir, "cache"))
+            settings.set("number-of-download-threads", threads)
+
+            index = PerUrlIndex(os.path.join(tmpdir, "data{n}.grb"))
+            n = [str(i) for i in range(8)]
+            urls_parts = index.lookup_request(dict(n=n, param=["t", "v"]))
+
+            assert [url for url, _ in urls_parts] == [
+                os.path.join(tmpdir, f"data{i}.grb") for i in range(8)
+            ]
+            for _, parts in urls_parts:
+                assert parts == [(0, 10), (20, 10)]
+
+            # Backends are reused, possibly from another thread
+            urls_parts = index.lookup_request(dict(n="3", param="u"))
+            assert urls_parts == [(os.path.join(tmpdir, "data3.grb"), [(10, 10)])]
+
+
+def test_indexing_per_url_metadata():
+    with temp_directory() as tmpdir:
+        write_index(os.path.join(tmpdir, "data0.grb.index"), 0)
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            index = PerUrlIndex(os.path.join(tmpdir, "data{n}.grb"))
+            urls_parts = index.lookup_request(
+                dict(n="0", param=["v", "t"]), metadata=True
+            )
+            assert urls_parts == [
+                (
+                    os.path.join(tmpdir, "data0.grb"),
+                    [(0, 10), (20, 10)],
+                    [dict(param="t", n="0"), dict(param="v", n="0")],
+                )
+            ]
+
+
+def test_indexing_per_url_memo():
+    with temp_directory() as tmpdir:
+        write_index(os.path.join(tmpdir, "data0.grb.index"), 0)
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            index = PerUrlIndex(os.path.join(tmpdir, "data{n}.grb"))
+            first = index.lookup_request(dict(n="0", param=["t"]))
+
+            with patch(
+                "climetlab.indexing.PerUrlIndex._lookup_request",
+                side_effect=AssertionError,
+            ):
+                assert index.lookup_request(dict(param="t", n=["0"])) == first
+
+            index.invalidate()
+            assert index.lookup_request(dict(param="t", n="0")) == first
+
+            # The user's request is not changed by a lookup
+            request = dict(n="0", param="u")
+            index.lookup_request(request)
+            assert request == dict(n="0", param="u")
+
+
+def test_indexing_per_url_refresh():
+    with temp_directory() as tmpdir:
+        path = os.path.join(tmpdir, "data0.grb")
+        write_index(path + ".index", 0, params=("t", "v"))
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            index = PerUrlIndex(os.path.join(tmpdir, "data{n}.grb"))
+            assert index.lookup_request(dict(n="0", param="u")) == []
+
+            # The index changes, but the database built from it is reused
+            write_index(path + ".index", 0)
+            assert index.lookup_request(dict(n="0", param="u")) == []
+            assert (
+                PerUrlIndex(index.pattern).lookup_request(dict(n="0", param="u")) == []
+            )
+
+            index.refresh()
+            assert index.lookup_request(dict(n="0", param="u")) == [(path, [(10, 10)])]
+            assert index.lookup_request(dict(n="0", param="v")) == [(path, [(20, 10)])]
+
+
+@pytest.mark.skipif(  # TODO: fix
+    sys.platform == "win32",
+    reason="file:// not working on Windows yet",
+)
+def test_indexing_per_url_parallel_downloads():
+    with temp_directory() as tmpdir:
+        for n in range(4):
+            shutil.copy(
+                climetlab_file("docs/examples/test.grib"),
+                os.path.join(tmpdir, f"data{n}.grb"),
+            )
+            with open(os.path.join(tmpdir, f"data{n}.grb.index"), "w") as f:
+                for offset, param in [(0, "2t"), (526, "msl")]:
+                    entry = dict(param=param, n=str(n), _offset=offset, _length=526)
+                    print(json.dumps(entry), file=f)
+
+        with settings.temporary():
+            settings.set("cache-directory", os.path.join(tmpdir, "cache"))
+            settings.set("number-of-download-threads", 4)
+
+            threads = set()
+            init = Url.__init__
+
+            def __init__(self, *args, **kwargs):
+                threads.add(threading.get_ident())
+                init(self, *args, **kwargs)
+
+            with patch.object(Url, "__init__", __init__):
+                index = PerUrlIndex(
+                    f"file://{tmpdir}/data{{n}}.grb",
+                    substitute_extension=lambda url: url[7:] + ".index",
+                )
+                ds = load_source(
+                    "indexed-urls", index, dict(n=["0", "1", "2", "3"], param="msl")
+                )
+
+            assert len(ds) == 4
+            assert [f._get("shortName") for f in ds] == ["msl"] * 4
+
+            # The urls are downloaded by the MultiSource thread pool
+            assert threading.get_ident() not in threads
+
+
+if __name__ == "__main__":
+    from climetlab.testing import main
+
+    main(__file__)
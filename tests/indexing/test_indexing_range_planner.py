@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import os
+from unittest.mock import patch
+
+from climetlab.core.temporary import temp_directory
+from climetlab.indexing.range_planner import RangePlanner
+from climetlab.sources.url import Url
+
+PARTS = [(i * 100_000, 1_000) for i in range(200)]
+
+
+def train(planner, url, latency, bandwidth):
+    for nranges, size in [(1, 10**6), (10, 10**7), (100, 10**5), (50, 10**8)]:
+        blocks = [(0, size // nranges)] * nranges
+        planner.observe("byte-ranges", url=url, parts=[], blocks=blocks)
+        elapsed = latency * nranges + size / bandwidth
+        planner.observe("transfer", url=url, total=size, elapsed=elapsed)
+
+
+def test_indexing_range_planner_default():
+    planner = RangePlanner()
+    assert planner.range_method("http://example.com/data.grib", PARTS) == "auto"
+
+
+def test_indexing_range_planner_latency_bound():
+    planner = RangePlanner()
+    train(planner, "http://slow.example.com/a.grib", latency=1.0, bandwidth=10**9)
+    train(planner, "http://fast.example.com/a.grib", latency=0.0001, bandwidth=10**5)
+
+    # High latency: few large ranges are prefered
+    method = planner.range_method("http://slow.example.com/b.grib", PARTS)
+    assert method.startswith("cluster(1)"), method
+
+    # Low bandwidth: download only the requested bytes
+    method = planner.range_method("http://fast.example.com/b.grib", PARTS)
+    assert method in ("auto", "blocked(256)"), method
+
+
+def test_indexing_range_planner_persistence():
+    with temp_directory() as tmpdir:
+        path = os.path.join(tmpdir, "planner.json")
+        planner = RangePlanner(path)
+        train(planner, "http://slow.example.com/a.grib", latency=1.0, bandwidth=10**9)
+        assert os.path.exists(path)
+
+        method = planner.range_method("http://slow.example.com/b.grib", PARTS)
+        assert (
+            RangePlanner(path).range_method("http://slow.example.com/b.grib", PARTS)
+            == method
+        )
+
+
+def test_indexing_range_planner_only_adaptive():
+    url = "https://example.com/test.grib"
+    with patch("climetlab.sources.url.Downloader") as downloader:
+        Url(url, parts=[(0, 526)])
+        gatherer = downloader.call_args.kwargs["statistics_gatherer"]
+        with patch("climetlab.sources.url.RANGE_PLANNER.observe") as observe:
+            gatherer("transfer", url=url, size=526, duration=1)
+            assert not observe.called
+
+        Url(url, parts=[(0, 526)], range_method="adaptive")
+        gatherer = downloader.call_args.kwargs["statistics_gatherer"]
+        with patch("climetlab.sources.url.RANGE_PLANNER.observe") as observe:
+            gatherer("transfer", url=url, size=526, duration=1)
+            assert observe.called
+
+
+if __name__ == "__main__":
+    from climetlab.testing import main
+
+    main(__file__)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import os
+import subprocess
+import sys
+
+import climetlab as cml
+from climetlab import readers
+
+
+def test_reader_candidates():
+    assert readers._candidates("data.grib", b"GRIB\x00\x00\x00\x02") == ["grib"]
+    assert readers._candidates("data.nc", b"\x89HDF\r\n\x1a\n") == ["netcdf"]
+    assert readers._candidates("data.npz", b"PK\x03\x04") == ["numpy", "zip"]
+    assert readers._candidates("data.csv", b"a,b,c\n1,") == ["csv"]
+    assert readers._candidates("data.tar.gz", b"\x1f\x8b\x08\x00") == ["tar"]
+    assert readers._candidates("data.unknown_ext", b"hello") == []
+
+
+def test_reader_lazy_imports():
+    path = os.path.join(os.path.dirname(__file__), "unknown_text_file.unknown_ext")
+    code = "\n".join(
+        [
+            "import sys",
+            "import climetlab as cml",
+            f"cml.load_source('file', {path!r})._reader",
+            "print(' '.join(m for m in sys.modules if m.startswith('climetlab.readers')))",
+        ]
+    )
+    modules = subprocess.check_output([sys.executable, "-c", code], text=True).split()
+
+    assert "climetlab.readers.text" in modules
+    for name in ("bufr", "grib", "netcdf", "odb", "tfrecord", "zip"):
+        assert f"climetlab.readers.{name}" not in modules
+
+
+def test_reader_detection_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.unknown_ext")
+    with open(path, "w") as f:
+        f.write("Some text\n")
+
+    calls = []
+    detect = readers._detect
+
+    def counting_detect(*args):
+        calls.append(args)
+        return detect(*args)
+
+    monkeypatch.setattr(readers, "_detect", counting_detect)
+
+    for _ in range(3):
+        s = cml.load_source("file", path)
+        assert isinstance(s._reader, cml.readers.text.TextReader)
+
+    assert len(calls) == 1
+
+    # The file has changed, so its format is detected again
+    with open(path, "w") as f:
+        f.write("Some other text\n")
+
+    s = cml.load_source("file", path)
+    assert isinstance(s._reader, cml.readers.text.TextReader)
+    assert len(calls) == 2
+
+
+if __name__ == "__main__":
+    from climetlab.testing import main
+
+    main(__file__)
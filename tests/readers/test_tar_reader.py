@@ -11,7 +11,11 @@
 
 
 import mimetypes
+import os
+import tarfile
 
+from climetlab import load_source, settings
+from climetlab.core.temporary import temp_directory
 from climetlab.testing import check_unsafe_archives
 
 
@@ -27,6 +31,55 @@ def test_tar_mimetypes():
     assert mimetypes.guess_type("x.tar.bz2") == ("application/x-tar", "bzip2")
 
 
+def make_archive(directory, mode):
+    names = []
+    for date in (20000101, 20000102):
+        path = os.path.join(directory, f"{date}.grib")
+        load_source("dummy-source", kind="grib", date=date).save(path)
+        names.append(path)
+
+    extension = {"w": ".tar", "w:gz": ".tar.gz"}[mode]
+    path = os.path.join(directory, f"archive{extension}")
+    with tarfile.open(path, mode) as tar:
+        for name in names:
+            tar.add(name, f"grib/{os.path.basename(name)}")
+
+    return path
+
+
+def test_tar_members():
+    with temp_directory() as tmpdir:
+        path = make_archive(tmpdir, "w")
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            # The GRIB members are read from the archive
+            ds = load_source("file", path)
+            assert len(ds) == 2
+            assert set(f[0] for f in ds.fields) == {path}
+
+            ds = load_source("file", path, filter="*/20000102.grib")
+            assert [f._get("date") for f in ds] == [20000102]
+
+
+def test_tar_compressed_members():
+    with temp_directory() as tmpdir:
+        path = make_archive(tmpdir, "w:gz")
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            ds = load_source("file", path, filter="*/20000102.grib")
+            assert [f._get("date") for f in ds] == [20000102]
+
+            # Only the selected members are extracted
+            (directory,) = [
+                p for p in os.listdir(os.path.join(tmpdir, "cache")) if p.endswith(".d")
+            ]
+            assert os.listdir(os.path.join(tmpdir, "cache", directory, "grib")) == [
+                "20000102.grib"
+            ]
+
+            assert len(load_source("file", path)) == 2
+
+
 if __name__ == "__main__":
     from climetlab.testing import main
 
@@ -9,6 +9,14 @@
 # nor does it submit to any jurisdiction.
 #
 
+import os
+from unittest.mock import patch
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from climetlab import load_source, settings
+from climetlab.core.temporary import temp_directory
+from climetlab.readers.grib.fieldset import FieldSet
+from climetlab.readers.zip import ZIPReader
 from climetlab.testing import check_unsafe_archives
 
 
@@ -16,6 +24,65 @@ def test_zip_safety():
     check_unsafe_archives(".zip")
 
 
+def make_archive(directory):
+    for date in (20000101, 20000102):
+        ds = load_source("dummy-source", kind="grib", date=date)
+        ds.save(os.path.join(directory, f"{date}.grib"))
+
+    with open(os.path.join(directory, "data.csv"), "w") as f:
+        f.write("a,b\n1,2\n3,4\n")
+
+    path = os.path.join(directory, "archive.zip")
+    with ZipFile(path, "w") as zip:
+        zip.write(os.path.join(directory, "20000101.grib"), "grib/20000101.grib")
+        zip.write(
+            os.path.join(directory, "20000102.grib"),
+            "grib/20000102.grib",
+            compress_type=ZIP_DEFLATED,
+        )
+        zip.write(os.path.join(directory, "data.csv"), "data.csv", ZIP_DEFLATED)
+        # Unsafe members are ignored
+        zip.writestr("../outside.txt", "Hello")
+        zip.writestr("/absolute.txt", "Hello")
+
+    return path
+
+
+def test_zip_members():
+    with temp_directory() as tmpdir:
+        path = make_archive(tmpdir)
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            with patch.object(
+                ZIPReader,
+                "extract",
+                autospec=True,
+                side_effect=ZIPReader.extract,
+            ) as extract:
+                ds = load_source("file", path, filter="grib/*.grib")
+                assert len(ds) == 2
+
+                # Only the compressed GRIB member is extracted
+                assert extract.call_count == 1
+                assert extract.call_args[0][1]["name"] == "grib/20000102.grib"
+
+            # The member stored without compression is read from the archive
+            ds = load_source("file", path, filter="grib/20000101.grib")
+            assert isinstance(ds, FieldSet)
+            assert [f[0] for f in ds.fields] == [path]
+            assert ds[0]._get("date") == 20000101
+
+            ds = load_source("file", path, filter="*.csv")
+            assert ds.to_pandas().shape == (2, 2)
+
+            # The index of the members is kept in the cache
+            with patch.object(ZIPReader, "scan", side_effect=AssertionError):
+                ds = load_source("file", path, filter="grib/20000102.grib")
+                assert ds[0]._get("date") == 20000102
+
+            assert len(load_source("file", path).sources) == 3
+
+
 if __name__ == "__main__":
     from climetlab.testing import main
 
@@ -9,9 +9,15 @@
 # nor does it submit to any jurisdiction.
 #
 
+import json
+from unittest.mock import patch
+
 import pytest
 
-from climetlab import load_source
+from climetlab import load_source, settings
+from climetlab.core.planning import volume
+from climetlab.core.temporary import temp_directory
+from climetlab.sources.cds import CDSRetriever
 from climetlab.testing import NO_CDS
 
 
@@ -77,6 +83,88 @@ def test_cds_csv_zip():
     # s.to_tfdataset()
 
 
+class LocalClient:
+    def __init__(self):
+        self.requests = []
+
+    def retrieve(self, dataset, request, target):
+        self.requests.append(request)
+        with open(target, "w") as f:
+            json.dump(request, f)
+
+
+def test_cds_request_planner():
+    local = LocalClient()
+    with temp_directory() as tmpdir, settings.temporary("cache-directory", tmpdir):
+        with patch("climetlab.sources.cds.client", lambda: local):
+            # The requests that only differ by their date are merged
+            s = CDSRetriever(
+                "dataset",
+                *[dict(date=f"2012-12-{d:02d}") for d in range(1, 11)],
+                variable="2t",
+                time=["00:00", "12:00"],
+            )
+            assert local.requests == [
+                dict(
+                    date=[f"2012-12-{d:02d}" for d in range(1, 11)],
+                    variable="2t",
+                    time=["00:00", "12:00"],
+                )
+            ]
+            assert len(s.path) == 1
+
+            local.requests.clear()
+            s = CDSRetriever(
+                "dataset",
+                date=[f"2012-12-{d:02d}" for d in range(11, 16)],
+                variable="2t",
+                time=["00:00", "12:00"],
+                split_on="date",
+            )
+            assert [r["date"] for r in local.requests] == [
+                f"2012-12-{d:02d}" for d in range(11, 16)
+            ]
+
+            # The dates cached by the previous split are not requested again
+            local.requests.clear()
+            s = CDSRetriever(
+                "dataset",
+                date=[f"2012-12-{d:02d}" for d in range(11, 21)],
+                variable="2t",
+                time=["00:00", "12:00"],
+            )
+            assert local.requests == [
+                dict(
+                    date=[f"2012-12-{d:02d}" for d in range(16, 21)],
+                    variable="2t",
+                    time=["00:00", "12:00"],
+                )
+            ]
+            assert len(s.path) == 6
+
+            # Requests that differ by a single-valued key are not merged
+            local.requests.clear()
+            CDSRetriever(
+                "dataset",
+                dict(format="grib"),
+                dict(format="netcdf"),
+                date="2012-12-21",
+                variable="2t",
+            )
+            assert sorted(r["format"] for r in local.requests) == ["grib", "netcdf"]
+
+            # Split by volume
+            local.requests.clear()
+            s = CDSRetriever(
+                "dataset",
+                date="2012-12-20",
+                variable=["2t", "msl", "tp"],
+                time=["00:00", "06:00", "12:00", "18:00"],
+                max_fields=4,
+            )
+            assert [volume(r) for r in local.requests] == [3, 3, 3, 3]
+
+
 if __name__ == "__main__":
     from climetlab.testing import main
 
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import json
+import os
+from unittest.mock import patch
+
+import pytest
+
+from climetlab import load_source, readers, settings
+from climetlab.core.manifest import DirectoryManifest, sniff
+from climetlab.core.temporary import temp_directory
+
+
+def test_directory_manifest():
+    with temp_directory() as tmpdir:
+        data = os.path.join(tmpdir, "data")
+        for i, date in enumerate((20000101, 20000102, 20000103)):
+            os.makedirs(os.path.join(data, str(i)))
+            ds = load_source("dummy-source", kind="grib", date=date)
+            ds.save(os.path.join(data, str(i), f"{date}.grib"))
+
+        with open(os.path.join(data, "README"), "w") as f:
+            f.write("Some text\n")
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            ds = load_source("directory", data, filter="*/*.grib")
+            assert len(ds) == 3
+
+            manifest = DirectoryManifest(data, filter=lambda p: p.endswith(".grib"))
+            with open(manifest.manifest) as f:
+                entries = json.load(f)["entries"]
+
+            assert sorted(entries) == [
+                "0/20000101.grib",
+                "1/20000102.grib",
+                "2/20000103.grib",
+                "README",
+            ]
+            entry = entries["0/20000101.grib"]
+            assert entry["format"] == "grib"
+            assert entry["index"] == readers.index_path(
+                "grib", os.path.join(data, "0", "20000101.grib")
+            )
+
+            # Files rejected by the filter are not opened
+            assert "format" not in entries["README"]
+
+            # Only modified files are opened again, and the formats of the others
+            # are not detected again
+            ds = load_source("dummy-source", kind="grib", date=20000104)
+            ds.save(os.path.join(data, "1", "20000102.grib"))
+            readers._DETECTED.clear()
+
+            with patch("climetlab.core.manifest.sniff", side_effect=sniff) as sniffed:
+                with patch("climetlab.readers._detect", side_effect=AssertionError):
+                    ds = load_source("directory", data, filter="*/*.grib")
+                    assert len(ds) == 3
+                    assert sorted(f._get("date") for f in ds) == [
+                        20000101,
+                        20000103,
+                        20000104,
+                    ]
+
+            assert sniffed.call_count == 1
+
+            # Deleted files are removed from the manifest
+            os.unlink(os.path.join(data, "2", "20000103.grib"))
+            assert len(load_source("directory", data, filter="*/*.grib")) == 2
+            assert len(DirectoryManifest(data, filter=lambda p: False).entries) == 3
+
+
+def test_directory_not_a_directory():
+    with temp_directory() as tmpdir:
+        with pytest.raises(NotADirectoryError):
+            load_source("directory", os.path.join(tmpdir, "missing"))
+
+
+if __name__ == "__main__":
+    from climetlab.testing import main
+
+    main(__file__)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+# (C) Copyright 2020 ECMWF.
+#
+# This software is licensed under the terms of the Apache Licence Version 2.0
+# which can be obtained at http://www.apache.org/licenses/LICENSE-2.0.
+# In applying this licence, ECMWF does not waive the privileges and immunities
+# granted to it by virtue of its status as an intergovernmental organisation
+# nor does it submit to any jurisdiction.
+#
+
+import os
+import shutil
+from unittest.mock import patch
+
+from climetlab import load_source, settings
+from climetlab.core.caching import cache_entries
+from climetlab.core.temporary import temp_directory
+from climetlab.testing import climetlab_file
+
+
+def test_indexed_files():
+    with temp_directory() as tmpdir:
+        data = os.path.join(tmpdir, "data")
+        os.makedirs(os.path.join(data, "2000"))
+        os.makedirs(os.path.join(data, "2001"))
+        for year in ("2000", "2001"):
+            shutil.copy(
+                climetlab_file("docs/examples/test.grib"),
+                os.path.join(data, year, "test.grib"),
+            )
+
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            ds = load_source("indexed-files", data, dict(param="msl"))
+            assert len(ds) == 2
+            assert [f.offset for f in ds] == [526, 526]
+            assert ds[0]._get("shortName") == "msl"
+
+            # The values of the index have the same type as in the file
+            field = load_source("file", climetlab_file("docs/examples/test.grib"))[1]
+            for key in ("date", "time", "step", "expver", "levtype"):
+                assert ds[0]._get(key) == field._get(key), key
+
+            # The cache knows the size of the updated index
+            (entry,) = [
+                e
+                for e in cache_entries()
+                if e["owner"] == "indexed-files" and e["path"].startswith(tmpdir)
+            ]
+            assert entry["size"] == os.path.getsize(entry["path"])
+
+            # Index is reused, no file is scanned again
+            with patch(
+                "climetlab.indexing.grib.index_grib_file",
+                side_effect=AssertionError,
+            ):
+                ds = load_source("indexed-files", data)
+                assert len(ds) == 4
+
+            # Deleted files are removed from the index
+            os.unlink(os.path.join(data, "2000", "test.grib"))
+            ds = load_source("indexed-files", data, dict(param=["msl", "2t"]))
+            assert len(ds) == 2
+
+
+if __name__ == "__main__":
+    from climetlab.testing import main
+
+    main(__file__)
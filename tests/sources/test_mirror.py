@@ -11,6 +11,7 @@
 
 
 import os
+from unittest.mock import patch
 
 import pytest
 
@@ -19,7 +20,13 @@ from climetlab.core.caching import purge_cache
 from climetlab.core.temporary import temp_directory
 from climetlab.mirrors import _reset_mirrors, get_active_mirrors
 from climetlab.mirrors.directory_mirror import DirectoryMirror
-from climetlab.testing import IN_GITHUB, NO_EOD, OfflineError, network_off
+from climetlab.testing import (
+    IN_GITHUB,
+    NO_EOD,
+    OfflineError,
+    http_server,
+    network_off,
+)
 
 
 def load(**kwargs):
@@ -248,6 +255,138 @@ def test_mirror_eod(mirror_dirs):
     assert str(source2) == str(source)
 
 
+def test_mirror_url_parts(mirror_dirs):
+    mirror_dir, _ = mirror_dirs
+    data = bytes(range(256)) * 4
+    parts = ((10, 5), (100, 20))
+    expected = data[10:15] + data[100:120]
+
+    with temp_directory() as tmpdir:
+        with open(os.path.join(tmpdir, "data.grib"), "wb") as f:
+            f.write(data)
+
+        with http_server(tmpdir) as server:
+            url = f"{server.url}/data.grib"
+            mirror = DirectoryMirror(path=mirror_dir, origin_prefix=server.url)
+
+            # The parts are extracted from the full file in the mirror
+            os.makedirs(os.path.join(mirror_dir, "url"))
+            with open(os.path.join(mirror_dir, "url", "data.grib"), "wb") as f:
+                f.write(data)
+
+            with mirror:
+                source = load_source("url", url, parts=parts)
+            with open(source.path, "rb") as f:
+                assert f.read() == expected
+            assert not source.path.startswith(mirror_dir)
+            assert server.requests == []
+
+            # Partial objects are created when prefetching, and used as they are
+            # (the test server only accepts a single range)
+            os.unlink(os.path.join(mirror_dir, "url", "data.grib"))
+            parts = ((100, 20),)
+            expected = data[100:120]
+            purge_cache()
+            with mirror.prefetch():
+                source = load_source("url", url, parts=parts)
+            assert len(server.requests) > 0
+
+            purge_cache()
+            del server.requests[:]
+            with mirror:
+                source = load_source("url", url, parts=parts)
+            with open(source.path, "rb") as f:
+                assert f.read() == expected
+            assert source.path.startswith(mirror_dir)
+            assert server.requests == []
+
+
+def test_mirror_url_parts_offline(mirror_dirs):
+    mirror_dir, _ = mirror_dirs
+    data = bytes(range(256)) * 4
+    parts = ((10, 5), (100, 20))
+
+    os.makedirs(os.path.join(mirror_dir, "url"))
+    with open(os.path.join(mirror_dir, "url", "data.grib"), "wb") as f:
+        f.write(data)
+
+    # The origin is never contacted, even when the parts are loaded again
+    origin = "http://127.0.0.1:9"
+    with DirectoryMirror(path=mirror_dir, origin_prefix=origin):
+        with patch("socket.socket", side_effect=OfflineError) as socket:
+            for _ in range(2):
+                source = load_source("url", f"{origin}/data.grib", parts=parts)
+                with open(source.path, "rb") as f:
+                    assert f.read() == data[10:15] + data[100:120]
+            assert socket.call_count == 0
+
+            # The parts are extracted again when the mirror is updated
+            path = source.path
+            mtime = os.path.getmtime(path)
+            full = os.path.join(mirror_dir, "url", "data.grib")
+            os.utime(full, (mtime + 1, mtime + 1))
+            source = load_source("url", f"{origin}/data.grib", parts=parts)
+            assert source.path == path
+            assert os.path.getmtime(path) > mtime
+            assert socket.call_count == 0
+
+
+def test_mirror_sync(mirror_dirs):
+    from climetlab.mirrors.sync import sync_mirror
+
+    mirror_dir, _ = mirror_dirs
+
+    with temp_directory() as tmpdir:
+        for name in ("a", "b", "c"):
+            with open(os.path.join(tmpdir, f"{name}.grib"), "wb") as f:
+                f.write(b"x" * 100)
+
+        with http_server(tmpdir) as server:
+            mirror = DirectoryMirror(path=mirror_dir, origin_prefix=server.url)
+            manifest = [
+                f"{server.url}/a.grib",
+                dict(pattern=f"{server.url}/{{name}}.grib", name=["b", "c"]),
+                f"{server.url}/missing.grib",
+            ]
+
+            report = sync_mirror(mirror, manifest, threads=2)
+            assert report.entries == 4
+            assert report.files == 3
+            assert report.bytes == 300
+            assert len(report.errors) == 1
+            for name in ("a", "b", "c"):
+                assert os.path.exists(os.path.join(mirror_dir, "url", f"{name}.grib"))
+            assert get_active_mirrors() == []
+
+            # Only the missing entries are downloaded
+            purge_cache()
+            report = sync_mirror(mirror, manifest[:2])
+            assert report.files == 0
+            assert report.bytes == 0
+
+
+def test_mirror_link_from_cache(mirror_dirs):
+    mirror_dir, _ = mirror_dirs
+
+    with temp_directory() as tmpdir:
+        with open(os.path.join(tmpdir, "data.grib"), "wb") as f:
+            f.write(b"x" * 100)
+
+        with http_server(tmpdir) as server:
+            url = f"{server.url}/data.grib"
+            cached = load_source("url", url).path
+
+            # The file of the cache is shared with the mirror, not downloaded again
+            del server.requests[:]
+            mirror = DirectoryMirror(path=mirror_dir, origin_prefix=server.url)
+            with mirror.prefetch():
+                source = load_source("url", url)
+
+            assert server.requests == []
+            assert source.path.startswith(mirror_dir)
+            assert os.stat(source.path).st_ino == os.stat(cached).st_ino
+
+
 if __name__ == "__main__":
     # test_mirror_url_source_1()
     from climetlab.testing import main
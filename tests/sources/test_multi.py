@@ -17,6 +17,8 @@ import pytest
 
 from climetlab import load_source
 from climetlab.core.temporary import temp_directory, temp_file
+from climetlab.sources import Source
+from climetlab.sources.multi import MultiSource
 from climetlab.testing import MISSING, TEST_DATA_URL
 
 LOG = logging.getLogger(__name__)
@@ -87,6 +89,55 @@ def test_multi_graph_2():
         assert len(ds) == 4
 
 
+class Range(Source):
+    def __init__(self, start, stop):
+        self.items = list(range(start, stop))
+        self.calls = 0
+
+    def __len__(self):
+        self.calls += 1
+        return len(self.items)
+
+    def __getitem__(self, n):
+        return self.items[n]
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+def test_multi_getitem():
+    sources = [Range(0, 3), Range(3, 3), Range(3, 10), Range(10, 11), Range(11, 20)]
+    ds = MultiSource(sources)
+
+    # Only the lengths of the first sources are needed
+    assert ds[4] == 4
+    assert [s.calls for s in sources] == [1, 1, 1, 0, 0]
+
+    assert len(ds) == 20
+    assert [ds[i] for i in range(20)] == list(range(20))
+    assert ds[-1] == 19
+    assert ds[-20] == 0
+    assert [s.calls for s in sources] == [1, 1, 1, 1, 1]
+
+    with pytest.raises(IndexError):
+        ds[20]
+
+
+def test_multi_read_ahead():
+    sources = [Range(i * 3, i * 3 + 3) for i in range(10)]
+    ds = MultiSource(sources, read_ahead=2)
+
+    iterator = iter(ds)
+    assert [next(iterator) for _ in range(4)] == [0, 1, 2, 3]
+    # The next sources have been prepared in the background
+    assert [s.calls for s in sources[:2]] == [0, 1]
+
+    assert list(iterator) == list(range(4, 30))
+    assert [s.calls for s in sources] == [0] + [1] * 9
+
+    assert list(ds) == list(range(30))
+
+
 def test_multi_directory_1():
     with temp_directory() as directory:
         for date in (20000101, 20000102):
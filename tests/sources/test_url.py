@@ -9,15 +9,24 @@
 # nor does it submit to any jurisdiction.
 #
 
+import asyncio
 import datetime
 import os
+import shutil
 import sys
+from unittest.mock import patch
 
 import pytest
 
-from climetlab import load_source, settings
+from climetlab import load_source, load_source_async, settings
 from climetlab.core.temporary import temp_directory
-from climetlab.testing import TEST_DATA_URL, climetlab_file, network_off
+from climetlab.testing import (
+    MISSING,
+    TEST_DATA_URL,
+    climetlab_file,
+    http_server,
+    network_off,
+)
 
 
 @pytest.mark.skipif(  # TODO: fix
@@ -173,6 +182,308 @@ def test_url_part_file_source():
         assert f.read() == b"GRIB7777GRIB7777"
 
 
+@pytest.mark.skipif(  # TODO: fix
+    sys.platform == "win32",
+    reason="file:// not working on Windows yet",
+)
+def test_url_part_grib_index():
+    filename = os.path.abspath(climetlab_file("docs/examples/test.grib"))
+
+    with temp_directory() as tmpdir:
+        with settings.temporary("cache-directory", tmpdir):
+            ds = load_source(
+                "url",
+                f"file://{filename}",
+                parts=[(526, 526)],
+                parts_metadata=[{"levelist": "500", "date": "20200513"}],
+            )
+
+            # The GRIB index is created from the parts, without scanning the file
+            with patch(
+                "climetlab.readers.grib.codes._get_message_offsets",
+                side_effect=AssertionError,
+            ):
+                assert len(ds) == 1
+                # Same types as the values read from the message
+                assert ds[0]._get("levelist") == 500
+                assert ds[0]._get("date") == 20200513
+                assert ds[0]._get("shortName") == "msl"
+
+            assert ds[0]._get("date") == load_source("file", filename)[1]._get("date")
+
+
+@pytest.mark.skipif(  # TODO: fix
+    sys.platform == "win32",
+    reason="file:// not working on Windows yet",
+)
+def test_url_part_several_messages():
+    filename = os.path.abspath(climetlab_file("docs/examples/test.grib"))
+
+    with temp_directory() as tmpdir:
+        with settings.temporary("cache-directory", tmpdir):
+            # Without metadata, a part can hold several messages
+            ds = load_source("url", f"file://{filename}", parts=[(0, 1052)])
+            assert [f._get("shortName") for f in ds] == ["2t", "msl"]
+
+            # Parts that are single messages are not scanned
+            ds = load_source("url", f"file://{filename}", parts=[(0, 526), (526, 526)])
+            with patch(
+                "climetlab.readers.grib.codes._get_message_offsets",
+                side_effect=AssertionError,
+            ):
+                assert [f._get("shortName") for f in ds] == ["2t", "msl"]
+
+
+@pytest.mark.skipif(  # TODO: fix
+    sys.platform == "win32",
+    reason="file:// not working on Windows yet",
+)
+def test_url_download_owners():
+    from climetlab.core.scheduler import DOWNLOAD_SCHEDULER
+    from climetlab.sources.url import Url
+
+    owners = []
+    connection = DOWNLOAD_SCHEDULER.connection
+
+    def record(url, owner=None, priority=0):
+        owners.append(owner)
+        return connection(url, owner=owner, priority=priority)
+
+    urls = []
+    init = Url.__init__
+
+    def __init__(self, *args, **kwargs):
+        urls.append(self)
+        init(self, *args, **kwargs)
+
+    filename = os.path.abspath(climetlab_file("docs/examples/test.grib"))
+
+    with temp_directory() as tmpdir:
+        with settings.temporary("cache-directory", os.path.join(tmpdir, "cache")):
+            with patch.object(DOWNLOAD_SCHEDULER, "connection", record):
+                a = load_source("url", f"file://{filename}", parts=[(0, 526)])
+                b = load_source("url", f"file://{filename}", parts=[(526, 526)])
+                assert owners == [a, b]
+
+            # The urls of a multi-source share their owner
+            for i in range(2):
+                shutil.copy(filename, os.path.join(tmpdir, f"data-{i}.grib"))
+
+            with patch.object(Url, "__init__", __init__):
+                ds = load_source(
+                    "url-pattern", f"file://{tmpdir}/data-{{n}}.grib", n=[0, 1]
+                )
+                assert len(ds) == 4
+
+            assert len(urls) == 2
+            assert urls[0].owner is urls[1].owner
+            assert urls[0].owner not in (a, b, None)
+
+
+def test_url_segmented_download():
+    with temp_directory() as tmpdir:
+        data = os.urandom(5 * 1024 * 1024 + 17)
+        with open(os.path.join(tmpdir, "large.bin"), "wb") as f:
+            f.write(data)
+
+        with http_server(tmpdir) as server, settings.temporary():
+            settings.set("cache-directory", os.path.join(tmpdir, "cache"))
+            settings.set("segmented-download-threshold", "4M")
+
+            ds = load_source("url", f"{server.url}/large.bin")
+
+            with open(ds.path, "rb") as f:
+                assert f.read() == data
+
+            ranges = sorted(r for m, _, r in server.requests if m == "GET")
+            assert ranges == [
+                "bytes=0-1310724",
+                "bytes=1310725-2621449",
+                "bytes=2621450-3932174",
+                "bytes=3932175-5242896",
+            ]
+
+
+def test_url_segmented_download_resume():
+    from climetlab.core.segmented import SegmentedDownload
+    from climetlab.sources.url import progress_bar
+
+    with temp_directory() as tmpdir:
+        data = os.urandom(4 * 1024 * 1024)
+        with open(os.path.join(tmpdir, "large.bin"), "wb") as f:
+            f.write(data)
+
+        with http_server(tmpdir) as server:
+            url = f"{server.url}/large.bin"
+            target = os.path.join(tmpdir, "target.bin")
+
+            def download():
+                SegmentedDownload(
+                    url,
+                    size=len(data),
+                    segments=2,
+                    chunk_size=1024 * 1024,
+                    progress_bar=progress_bar,
+                ).download(target)
+
+            # Interrupt the second segment after its first chunk
+            write = SegmentedDownload._write
+
+            def failing_write(self, fd, data, offset):
+                if offset == 3 * 1024 * 1024:
+                    raise OSError("Interrupted")
+                write(self, fd, data, offset)
+
+            with patch.object(SegmentedDownload, "_write", failing_write):
+                with pytest.raises(OSError):
+                    download()
+
+            assert not os.path.exists(target)
+            del server.requests[:]
+            download()
+
+            with open(target, "rb") as f:
+                assert f.read() == data
+
+            # Only the missing bytes are downloaded
+            assert server.requests == [("GET", "/large.bin", "bytes=3145728-4194303")]
+
+
+def test_url_shared_session():
+    with temp_directory() as tmpdir:
+        for i in range(10):
+            with open(os.path.join(tmpdir, f"small-{i}.bin"), "wb") as f:
+                f.write(os.urandom(1024))
+
+        with http_server(tmpdir) as server, settings.temporary():
+            settings.set("cache-directory", os.path.join(tmpdir, "cache"))
+
+            for i in range(10):
+                ds = load_source("url", f"{server.url}/small-{i}.bin")
+                assert os.path.getsize(ds.path) == 1024
+
+            # All the requests share the same connection
+            assert len(server.requests) == 20
+            assert server.connections == 1
+
+
+def test_url_freshness():
+    with temp_directory() as tmpdir:
+        with open(os.path.join(tmpdir, "small.bin"), "wb") as f:
+            f.write(os.urandom(1024))
+
+        with http_server(tmpdir) as server, settings.temporary():
+            settings.set("cache-directory", os.path.join(tmpdir, "cache"))
+            url = f"{server.url}/small.bin"
+
+            load_source("url", url)
+            assert [m for m, _, _ in server.requests] == ["HEAD", "GET"]
+
+            # Checked recently, no request
+            for _ in range(5):
+                load_source("url", url)
+            assert len(server.requests) == 2
+
+            # Freshness expired, the server is asked again
+            settings.set("url-freshness-period", None)
+            load_source("url", url)
+            assert [m for m, _, _ in server.requests] == ["HEAD", "GET", "HEAD"]
+
+
+def test_url_is_fresh():
+    from climetlab.sources.url import CHECKED, is_fresh
+
+    with settings.temporary("url-freshness-period", "10m"):
+        assert is_fresh({CHECKED: 1000}, now=1500)
+        assert not is_fresh({CHECKED: 1000}, now=1700)
+        assert not is_fresh({}, now=1000)
+        assert not is_fresh(None, now=1000)
+
+        # The server knows better
+        data = {CHECKED: 1000, "cache-control": "public, max-age=60"}
+        assert not is_fresh(data, now=1100)
+        data = {CHECKED: 1000, "cache-control": "max-age=3600"}
+        assert is_fresh(data, now=1700)
+        data = {CHECKED: 1000, "cache-control": "no-cache"}
+        assert not is_fresh(data, now=1001)
+
+
+def test_url_stream_grib():
+    with temp_directory() as tmpdir:
+        with open(climetlab_file("docs/examples/test.grib"), "rb") as f:
+            data = f.read()
+        with open(os.path.join(tmpdir, "large.grib"), "wb") as f:
+            # Some garbage between the messages
+            f.write((data + b"1234") * 20)
+
+        with http_server(tmpdir) as server, settings.temporary():
+            settings.set("cache-directory", os.path.join(tmpdir, "cache"))
+            settings.set("maximum-download-bandwidth", "40K")
+            url = f"{server.url}/large.grib"
+
+            ds = load_source("url", url, stream=True, chunk_size=1024)
+
+            fields = []
+            for field in ds:
+                if not fields:
+                    # The first field is available before the end of the download
+                    assert ds.path is None
+                fields.append(field)
+
+            assert [f._get("shortName") for f in fields] == ["2t", "msl"] * 20
+            assert os.path.getsize(ds.path) == len(data + b"1234") * 20
+
+            # The fields now read the file of the cache
+            assert set(f._reader.path for f in fields) == {ds.path}
+            assert fields[-1].values.shape == fields[1].values.shape
+
+            # The file is in the cache
+            with network_off():
+                ds = load_source("url", url, stream=True)
+                assert [f._get("shortName") for f in ds] == ["2t", "msl"] * 20
+                assert len(ds) == 40
+
+
+@pytest.mark.skipif(MISSING("aiohttp"), reason="No aiohttp")
+def test_url_load_source_async():
+    with temp_directory() as tmpdir:
+        data = {}
+        for i in range(20):
+            data[i] = os.urandom(1024 * i)
+            with open(os.path.join(tmpdir, f"small-{i}.bin"), "wb") as f:
+                f.write(data[i])
+
+        async def load(server):
+            return await asyncio.gather(
+                *[
+                    load_source_async("url", f"{server.url}/small-{i}.bin")
+                    for i in range(20)
+                ]
+            )
+
+        with http_server(tmpdir) as server, settings.temporary():
+            settings.set("cache-directory", os.path.join(tmpdir, "cache"))
+            settings.set("check-out-of-date-urls", False)
+            settings.set("maximum-connections-per-host", 2)
+
+            sources = asyncio.run(load(server))
+
+            # The limits of the threaded downloads apply, and the
+            # connections are reused
+            assert server.connections <= 2
+
+            for i, ds in enumerate(sources):
+                with open(ds.path, "rb") as f:
+                    assert f.read() == data[i]
+
+            # The data was fetched on the event loop, and the cache entries
+            # are the ones of the url source
+            assert [m for m, _, _ in server.requests] == ["GET"] * 20
+            ds = load_source("url", f"{server.url}/small-3.bin")
+            assert ds.path == sources[3].path
+            assert len(server.requests) == 20
+
+
 if __name__ == "__main__":
     test_part_url()
     # from climetlab.testing import main
@@ -119,6 +119,34 @@ def test_zarr_from_zip_file():
     assert "lat" in ds.dims
 
 
+def test_zarr_virtual_concat():
+    import numpy as np
+    import xarray as xr
+
+    from climetlab.mergers.xarray import virtual_concat
+
+    def forecast(times):
+        return xr.Dataset(
+            {
+                "t2m": (("forecast_time", "lat"), np.outer(times, np.ones(3))),
+                "lsm": (("lat",), np.zeros(3)),
+            },
+            coords={"forecast_time": times, "lat": [10, 20, 30]},
+        ).chunk()
+
+    ds = virtual_concat([forecast([4, 1, 2]), forecast([3, 0])], "forecast_time")
+
+    assert list(ds.forecast_time.values) == [0, 1, 2, 3, 4]
+    assert ds.t2m.dims == ("forecast_time", "lat")
+    assert ds.lsm.dims == ("lat",)
+    assert ds.t2m.chunks is not None
+    assert "forecast_time" in ds.indexes
+    assert list(ds.t2m.values[:, 0]) == [0, 1, 2, 3, 4]
+
+    ds = virtual_concat([forecast([0, 1]), forecast([1, 2])], "forecast_time")
+    assert list(ds.forecast_time.values) == [0, 1, 2]
+
+
 # @pytest.skip(reason="The test http server does not allow zarr hosting from outside of ECMWF.")
 @pytest.mark.skipif(MISSING("zarr", "s3fs"), reason="Zarr or S3FS not installed")
 def test_http_does_support_zarr():
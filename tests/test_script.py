@@ -8,13 +8,18 @@
 #
 
 import logging
+import os
 import re
+import shutil
 
 import pytest
 import yaml
 
 from climetlab import settings
+from climetlab.core.temporary import temp_directory
+from climetlab.indexing.database import SqlDatabase
 from climetlab.scripts.main import CliMetLabApp
+from climetlab.testing import climetlab_file
 
 LOG = logging.getLogger(__name__)
 
@@ -109,6 +114,55 @@ def test_cli_df(capsys):
     assert err == "", err
 
 
+@pytest.mark.parametrize("workers", [1, 2])
+def test_cli_index_gribs_database(capsys, workers):
+    with temp_directory() as tmpdir:
+        data = os.path.join(tmpdir, "data")
+        os.mkdir(data)
+        for i in range(3):
+            shutil.copy(
+                climetlab_file("docs/examples/test.grib"),
+                os.path.join(data, f"{i}.grib"),
+            )
+        db = os.path.join(tmpdir, "index.db")
+
+        app = CliMetLabApp()
+        app.onecmd(f"index_gribs {data} --output {db} --workers {workers}")
+        out, err = capsys.readouterr()
+        assert out == "", out
+        assert "Indexed 3 file(s)" in err and "0 up-to-date" in err, err
+
+        parts = SqlDatabase(db).lookup(dict(param="2t"))
+        assert sorted(p[0] for p in parts) == [
+            os.path.join(data, f"{i}.grib") for i in range(3)
+        ]
+        assert all(p[1] == (0, 526) for p in parts)
+
+        app.onecmd(f"index_gribs {data} --output {db} --workers {workers}")
+        out, err = capsys.readouterr()
+        assert "Indexed 0 file(s)" in err and "3 up-to-date" in err, err
+        assert len(SqlDatabase(db).lookup(dict(param="msl"))) == 3
+
+
+def test_cli_mirror_sync(capsys):
+    from climetlab.testing import http_server
+
+    with temp_directory() as tmpdir, temp_directory() as mirror:
+        shutil.copy(climetlab_file("docs/examples/test.grib"), tmpdir)
+        manifest = os.path.join(tmpdir, "manifest.yaml")
+
+        with http_server(tmpdir) as server:
+            with open(manifest, "w") as f:
+                yaml.dump([f"{server.url}/test.grib"], f)
+
+            app = CliMetLabApp()
+            app.onecmd(f"mirror sync {manifest} --path {mirror} --prefix {server.url}")
+            out, err = capsys.readouterr()
+
+        assert "Files downloaded: 1" in out, out
+        assert os.path.exists(os.path.join(mirror, "url", "test.grib"))
+
+
 if __name__ == "__main__":
     from climetlab.testing import main
 
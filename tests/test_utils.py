@@ -14,7 +14,9 @@ import os
 
 import pytest
 
+from climetlab.core.temporary import temp_directory
 from climetlab.utils import load_json_or_yaml, string_to_args
+from climetlab.utils.files import extract_parts, materialise
 from climetlab.utils.humanize import (
     as_bytes,
     as_seconds,
@@ -209,6 +211,35 @@ def test_as_seconds():
     assert as_seconds("2h") == 2 * 60 * 60
 
 
+def test_materialise():
+    data = bytearray(range(256)) * 10
+
+    with temp_directory() as tmpdir:
+        source = os.path.join(tmpdir, "source")
+        with open(source, "wb") as f:
+            f.write(data)
+
+        target = os.path.join(tmpdir, "linked")
+        materialise(source, target)
+        assert os.stat(target).st_ino == os.stat(source).st_ino
+
+        target = os.path.join(tmpdir, "copied")
+        materialise(source, target, link=False)
+        assert os.stat(target).st_ino != os.stat(source).st_ino
+        with open(target, "rb") as f:
+            assert f.read() == data
+
+        assert sorted(os.listdir(tmpdir)) == ["copied", "linked", "source"]
+
+        target = os.path.join(tmpdir, "parts")
+        extract_parts(source, [(10, 20), (1000, 500)], target)
+        with open(target, "rb") as f:
+            assert f.read() == data[10:30] + data[1000:1500]
+
+        with pytest.raises(EOFError):
+            extract_parts(source, [(2500, 200)], target)
+
+
 if __name__ == "__main__":
     from climetlab.testing import main
 